@@ -0,0 +1,65 @@
+# ai/chat_memory.py (Token-budgeted history windowing for the coach chat)
+
+from dotenv import load_dotenv
+import os
+from typing import List, Dict, Tuple
+from starlette.concurrency import run_in_threadpool
+from database.database import SessionLocal
+from database import crud
+from ai.coach_agent import summarize_chat_async
+
+load_dotenv()
+# Turns kept verbatim in the prompt; anything older lives only in the rolled-up summary
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 6))
+# Extra turns allowed to pile up before a summary roll (so we don't call the LLM on every message)
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", 4))
+# Token budget for summary + history + user message in a single prompt
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", 1500))
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English); avoids a count_tokens round trip."""
+    return len(text) // 4 + 1
+
+def build_chat_window(summary: str, turns: List[Dict], user_message: str) -> Tuple[str, List[Dict]]:
+    """
+    Returns (summary, recent_turns) that fit CHAT_PROMPT_TOKEN_BUDGET.
+    Keeps at most CHAT_HISTORY_TURNS recent turns, drops the oldest of them first when over
+    budget, and finally truncates the summary (keeping its most recent part).
+    """
+    recent = list(turns[-CHAT_HISTORY_TURNS:]) if CHAT_HISTORY_TURNS > 0 else []
+    budget = CHAT_PROMPT_TOKEN_BUDGET - estimate_tokens(user_message)
+    summary_cost = estimate_tokens(summary) if summary else 0
+
+    history_cost = sum(estimate_tokens(t["message"]) for t in recent)
+    while recent and summary_cost + history_cost > budget:
+        history_cost -= estimate_tokens(recent.pop(0)["message"])
+
+    remaining = budget - history_cost
+    if summary and summary_cost > remaining:
+        summary = summary[-max(remaining, 0) * 4:] if remaining > 0 else ""
+
+    return summary, recent
+
+async def roll_chat_summary(session_id: int, user_id: int):
+    """
+    Background task: once more than CHAT_HISTORY_TURNS + CHAT_SUMMARY_BATCH turns are
+    unsummarized, folds everything but the last CHAT_HISTORY_TURNS into the session summary.
+    Uses its own DB session because it runs after the request's session is closed.
+    """
+    db = SessionLocal()
+    try:
+        chat_session, turns = await run_in_threadpool(crud.load_chat_context, db, user_id, session_id)
+        if len(turns) <= CHAT_HISTORY_TURNS + CHAT_SUMMARY_BATCH:
+            return
+
+        evicted = turns[:len(turns) - CHAT_HISTORY_TURNS]
+        new_summary = await summarize_chat_async(
+            chat_session.summary,
+            [{"role": t.role, "message": t.message} for t in evicted]
+        )
+        await run_in_threadpool(crud.update_chat_summary, db, session_id, new_summary, evicted[-1].id)
+    except Exception as e:
+        # A failed roll only means the next request carries a few more verbatim turns
+        print(f"Chat summary roll failed for session {session_id}: {e}")
+    finally:
+        db.close()
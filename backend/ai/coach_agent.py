@@ -3,62 +3,67 @@
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+import asyncio
+from collections import deque
 import os
-from typing import List, Dict
+from typing import List, Dict, AsyncIterator, Optional
 import random
-from datetime import datetime, timedelta
+import numpy as np
 from database.schemas import InvestmentAction
+from ai.price_store import ASSET_LIST, get_price_history
+from utils.prometheus import observe_llm_usage, track_llm_call
 
 # --- Configuration and Client Initialization ---
 load_dotenv()
 # We use the correct environment variable name for Google's API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") 
 
+# Set outside the try: with no API key, a stand-in client (scripts/bench_load.py) still needs a model name
+MODEL = 'gemini-2.5-flash' # Chosen for speed and chat capability
+
 try:
     client = genai.Client(api_key=GEMINI_API_KEY)
-    MODEL = 'gemini-2.5-flash' # Chosen for speed and chat capability
 except Exception as e:
     # If key fails, use a mock client to unblock Mallika and Muneer
     print(f"Gemini client initialization failed: {e}. Using mock functions.")
     client = None
 
+# Caps how many Gemini calls can be in flight at once (per worker) from the async variants.
+# Requests above the cap wait on the semaphore instead of piling onto the model.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+def _generate_content(function: str, **kwargs):
+    """Calls the genai client, recording latency / errors / tokens under `function` (see utils/prometheus.py)."""
+    with track_llm_call(function):
+        response = client.models.generate_content(**kwargs)
+    observe_llm_usage(function, response)
+    return response
+
+async def _generate_content_async(function: str, **kwargs):
+    """Awaits the genai async client under the concurrency semaphore. Accepts the same kwargs as generate_content."""
+    async with _llm_semaphore:
+        with track_llm_call(function):
+            response = await client.aio.models.generate_content(**kwargs)
+    observe_llm_usage(function, response)
+    return response
+
 # --- Investment Simulation Logic (Internal Tool for the LLM) ---
 
-STATIC_ASSET_HISTORY = {}
-ASSET_LIST = [
-    "AAPL", "GOOG", "MSFT", "TSLA", "AMZN", 
-    "VTI", "VOO", "SBUX", "DIS", "JNJ",
-    "GOLD_ETF", "US_BONDS", "IND_FUND"
-]
-
-def _generate_mock_prices(base_price, volatility):
-    """Helper to generate a slightly variable price trend."""
-    prices = []
-    current_date = datetime.now().date()
-    current_price = base_price
-    
-    for i in range(9, -1, -1):
-        date = (current_date - timedelta(days=i)).isoformat()
-        # Price fluctuates based on volatility
-        change = random.uniform(-volatility, volatility)
-        current_price += change
-        current_price = max(current_price, base_price * 0.95) # Keep price realistic
-        prices.append({"date": date, "price": round(current_price, 2)})
-    return prices
-
-for symbol in ASSET_LIST:
-    base = 150.0 + (hash(symbol) % 100) # Unique base price
-    volatility = 1.0 + (hash(symbol) % 3) / 2 # Unique volatility
-    STATIC_ASSET_HISTORY[symbol] = _generate_mock_prices(base, volatility)
+# Price history lives in a seeded, memory-mapped store shared by every worker (see ai/price_store.py)
 
 def get_mock_asset_history(symbol: str) -> List[Dict]:
     """Retrieves the static 10-day historical data for a symbol."""
-    return STATIC_ASSET_HISTORY.get(symbol, [])
+    return get_price_history(symbol)
+
+def _mock_rate(risk: str) -> float:
+    """Mock annual rate per risk level (anything unrecognised is treated as High)."""
+    # Use different rates to provide meaningful simulation results
+    return 0.05 if risk == 'Low' else 0.08 if risk == 'Medium' else 0.12 # Mock rates
 
 def run_mock_simulation(start: float, monthly: float, years: int, risk: str) -> Dict:
     """Mocks a backend compounding interest calculation."""
-    # Use different rates to provide meaningful simulation results
-    RATE = 0.05 if risk == 'Low' else 0.08 if risk == 'Medium' else 0.12 # Mock rates
+    RATE = _mock_rate(risk)
     
     total_months = years * 12
     # Standard Future Value formula (simplified)
@@ -76,15 +81,23 @@ def run_mock_simulation(start: float, monthly: float, years: int, risk: str) ->
         "total_gain": round(future_value - total_contributed)
     }
 
-# --- AI Generative Functions ---
+def run_mock_simulation_grid(starts: List[float], monthlies: List[float], years: List[int], risks: List[str]) -> np.ndarray:
+    """
+    Evaluates run_mock_simulation's future-value formula for the whole cartesian grid in one
+    broadcasted NumPy pass. Returns projected final values, shape (risks, starts, monthlies, years).
+    """
+    rate = np.array([_mock_rate(r) for r in risks]).reshape(-1, 1, 1, 1) / 12
+    start = np.asarray(starts, dtype=float).reshape(1, -1, 1, 1)
+    monthly = np.asarray(monthlies, dtype=float).reshape(1, 1, -1, 1)
+    months = np.asarray(years, dtype=float).reshape(1, 1, 1, -1) * 12
 
-def generate_financial_summary(user_data: Dict, expenses: List[Dict]) -> str:
-    """Generates the three-part personalized budget summary."""
-    if not client: return "AI Coach is currently offline. Check API key."
+    growth = (1 + rate) ** months
+    return start * growth + monthly * ((growth - 1) / rate)
 
-    # Convert complex expenses list into a simpler string for the LLM
-    expense_summary = "\n".join([f"Category: {e['category']}, Amount: {e['amount']}" for e in expenses])
-    
+# --- AI Generative Functions ---
+
+def _build_financial_summary_prompt(user_data: Dict, expenses: List[Dict]) -> str:
+    """Builds the budget summary prompt (shared by the sync and async variants)."""
     # Analyze spending by category (Amogh's P3 task from previous steps)
     category_totals = {}
     for e in expenses:
@@ -121,18 +134,34 @@ def generate_financial_summary(user_data: Dict, expenses: List[Dict]) -> str:
     ### 🚀 Next Step Nudge
     [One specific, actionable tip for habit change.]
     """
-    
-    response = client.models.generate_content(
+    return prompt
+
+def generate_financial_summary(user_data: Dict, expenses: List[Dict]) -> str:
+    """Generates the three-part personalized budget summary."""
+    if not client: return "AI Coach is currently offline. Check API key."
+
+    response = _generate_content(
+        "generate_financial_summary",
         model=MODEL,
-        contents=prompt,
+        contents=_build_financial_summary_prompt(user_data, expenses),
         config=types.GenerateContentConfig(temperature=0.4)
     )
     return response.text
 
-def generate_investment_micro_course(user_data: Dict, simulation_result: Dict) -> str:
-    """Generates the investment micro-course based on simulation results."""
-    if not client: return "AI Course Generator is offline."
-    
+async def generate_financial_summary_async(user_data: Dict, expenses: List[Dict]) -> str:
+    """Async variant of generate_financial_summary (non-blocking, concurrency-limited)."""
+    if not client: return "AI Coach is currently offline. Check API key."
+
+    response = await _generate_content_async(
+        "generate_financial_summary",
+        model=MODEL,
+        contents=_build_financial_summary_prompt(user_data, expenses),
+        config=types.GenerateContentConfig(temperature=0.4)
+    )
+    return response.text
+
+def _build_micro_course_prompt(user_data: Dict, simulation_result: Dict) -> str:
+    """Builds the micro-course prompt (shared by the sync and async variants)."""
     # Combine user goals with structured simulation data
     simulation_text = (
         f"Goal: {user_data.get('goal_name')}. "
@@ -151,46 +180,133 @@ def generate_investment_micro_course(user_data: Dict, simulation_result: Dict) -
     
     DATA: {simulation_text}
     """
-    
-    response = client.models.generate_content(
+    return prompt
+
+def generate_investment_micro_course(user_data: Dict, simulation_result: Dict) -> str:
+    """Generates the investment micro-course based on simulation results."""
+    if not client: return "AI Course Generator is offline."
+
+    response = _generate_content(
+        "generate_investment_micro_course",
         model=MODEL,
-        contents=prompt,
+        contents=_build_micro_course_prompt(user_data, simulation_result),
         config=types.GenerateContentConfig(temperature=0.5)
     )
     return response.text
 
-def get_chat_response(user_message: str, chat_history: List[Dict]) -> str:
-    """Handles conversational chat, including general Q&A and financial literacy."""
-    if not client: return "AI Chatbot is offline."
+async def generate_investment_micro_course_async(user_data: Dict, simulation_result: Dict) -> str:
+    """Async variant of generate_investment_micro_course."""
+    if not client: return "AI Course Generator is offline."
 
-    # Inject the history and a system persona
+    response = await _generate_content_async(
+        "generate_investment_micro_course",
+        model=MODEL,
+        contents=_build_micro_course_prompt(user_data, simulation_result),
+        config=types.GenerateContentConfig(temperature=0.5)
+    )
+    return response.text
+
+def format_chat_history(chat_history: List[Dict]) -> str:
+    """Renders [{'role': ..., 'message': ...}] as plain 'User:'/'Coach:' lines for the prompt."""
+    return "\n".join(
+        f"{'User' if turn['role'] == 'user' else 'Coach'}: {turn['message']}" for turn in chat_history
+    )
+
+def _build_chat_prompt(user_message: str, chat_history: List[Dict], summary: str = "") -> str:
+    """Injects the (windowed) history, the rolled-up summary and a system persona into the chat prompt."""
     full_prompt = f"""
     SYSTEM ROLE: You are 'Frugal Friend,' an empathetic and witty AI Financial Coach. 
     Your goal is to answer user questions, guide them to financial literacy, and encourage saving. 
     Keep responses concise and conversational.
     
-    CHAT HISTORY: {chat_history}
+    EARLIER CONVERSATION SUMMARY: {summary or "None"}
+    RECENT CHAT HISTORY:
+    {format_chat_history(chat_history)}
     USER MESSAGE: {user_message}
     """
-    
-    response = client.models.generate_content(
+    return full_prompt
+
+def get_chat_response(user_message: str, chat_history: List[Dict], summary: str = "") -> str:
+    """Handles conversational chat, including general Q&A and financial literacy."""
+    if not client: return "AI Chatbot is offline."
+
+    response = _generate_content(
+        "get_chat_response",
         model=MODEL,
-        contents=full_prompt,
+        contents=_build_chat_prompt(user_message, chat_history, summary),
         config=types.GenerateContentConfig(temperature=0.7)
     )
     return response.text
 
-# ai/coach_agent.py (New function for transactional simulation)
+async def get_chat_response_async(user_message: str, chat_history: List[Dict], summary: str = "") -> str:
+    """Async variant of get_chat_response."""
+    if not client: return "AI Chatbot is offline."
 
-def execute_investment_simulation(user_id: int, action_data: Dict) -> Dict: 
+    response = await _generate_content_async(
+        "get_chat_response",
+        model=MODEL,
+        contents=_build_chat_prompt(user_message, chat_history, summary),
+        config=types.GenerateContentConfig(temperature=0.7)
+    )
+    return response.text
+
+async def stream_chat_response_async(user_message: str, chat_history: List[Dict], summary: str = "") -> AsyncIterator[str]:
     """
-    Simulates a real-time investment transaction via the AI agent.
-    Returns structured status update and calls Gemini for advice generation.
+    Streaming variant of get_chat_response: yields text chunks as Gemini produces them.
+    One semaphore slot is held for the whole stream, since the model is busy until it ends.
     """
-    global client, MODEL # Access global variables
-    if not client: 
-        return {"status": "error", "message": "Simulation offline. Gemini API key issue.", "advice_nudge": "Please check your .env file."}
+    if not client:
+        yield "AI Chatbot is offline."
+        return
+
+    last_chunk = None
+    async with _llm_semaphore:
+        with track_llm_call("stream_chat_response"):
+            stream = await client.aio.models.generate_content_stream(
+                model=MODEL,
+                contents=_build_chat_prompt(user_message, chat_history, summary),
+                config=types.GenerateContentConfig(temperature=0.7)
+            )
+            async for chunk in stream:
+                last_chunk = chunk
+                if chunk.text:
+                    yield chunk.text
+    observe_llm_usage("stream_chat_response", last_chunk) # Usage totals arrive on the final chunk
+
+async def summarize_chat_async(previous_summary: str, turns: List[Dict], max_words: int = 120) -> str:
+    """
+    Folds older chat turns into the running conversation summary (incremental: only the new
+    turns and the previous summary are sent, never the full transcript).
+    """
+    if not client:
+        # Offline fallback: keep the tail of a plain-text digest
+        digest = f"{previous_summary} {format_chat_history(turns)}".strip()
+        return digest[-max_words * 6:]
+
+    prompt = f"""
+    SYSTEM ROLE: You maintain the memory of a financial coaching chat.
+    
+    INSTRUCTIONS:
+    1. Update the EXISTING SUMMARY with the NEW TURNS.
+    2. Keep facts about the user's finances, goals and open questions; drop small talk.
+    3. Output ONLY the updated summary, at most {max_words} words.
+    
+    EXISTING SUMMARY: {previous_summary or "None"}
+    NEW TURNS:
+    {format_chat_history(turns)}
+    """
+    response = await _generate_content_async(
+        "summarize_chat",
+        model=MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(temperature=0.2)
+    )
+    return response.text.strip()
+
+# ai/coach_agent.py (New function for transactional simulation)
 
+def _mock_trade_outcome(action_data: Dict) -> Dict:
+    """Mocks the paper trade outcome (no LLM call)."""
     # 1. Mock the outcome based on amount
     # CRITICAL: action_data is now treated as a dictionary (dict)
     if action_data['amount'] > 500 and action_data['action'] == 'Buy': 
@@ -204,80 +320,179 @@ def execute_investment_simulation(user_id: int, action_data: Dict) -> Dict:
     else:
         msg = f"Order FAILED: Market volatility detected. The paper engine blocked the transaction to limit risk."
 
-    # 2. Witty Nudge Generation Prompt
-    # FIX: Using bracket notation (action_data['key']) everywhere in the prompt
-    prompt = f"""
+    return {"status": status_key, "message": msg}
+
+# --- Trade nudges: pre-generated so a trade never waits on Gemini ---
+
+NUDGE_POOL_SIZE = int(os.getenv("NUDGE_POOL_SIZE", 8)) # Nudges generated per key in one LLM call
+# Nudges served from a key before it is regenerated (default: one full rotation, so no repeats in between)
+NUDGE_POOL_MAX_SERVES = int(os.getenv("NUDGE_POOL_MAX_SERVES", NUDGE_POOL_SIZE))
+NUDGE_ASSET_TYPES = ("Stock", "Mutual Fund", "Gold")
+
+# Served until Gemini has generated fresh nudges for a key (and forever when it's offline)
+STATIC_NUDGES = {
+    ("Buy", "success"): [
+        "Bought! Now the hard part: leaving it alone long enough to grow.",
+        "Nice entry. Time in the market beats timing the market.",
+        "Order in. Consistency, not perfection, builds wealth.",
+    ],
+    ("Buy", "failure"): [
+        "Blocked this time. Patience is a position too.",
+        "No fill, no problem. Every pro has missed a trade; the lesson is what counts.",
+        "The market said 'not today'. Breathe, review, try again with a plan.",
+    ],
+    ("Sell", "success"): [
+        "Sold! Just make sure it was your plan talking, not your nerves.",
+        "Profits or lessons, both count. Decide what that cash does next.",
+        "Trimmed. Disciplined exits are as important as good entries.",
+    ],
+    ("Sell", "failure"): [
+        "Sale blocked. Sometimes the best move is the one you don't make.",
+        "Couldn't sell right now. Use the pause to revisit why you wanted out.",
+        "No exit this time. Long-term thinking rarely needs a rush.",
+    ],
+    ("Basket", "success"): [
+        "Basket done! Rebalancing on a plan beats reacting to every headline.",
+        "Rebalanced. Diversification is the only free lunch in investing.",
+        "All orders in. Boring, deliberate portfolios tend to win.",
+    ],
+}
+
+def _build_nudge_pool_prompt(action: str, status_key: str, asset_type: str, count: int) -> str:
+    subject = "a basket of simulated orders (a rebalance)" if action == "Basket" else f"a simulated '{action}' of a {asset_type}"
+    return f"""
     SYSTEM ROLE: You are the trading engine for 'The Frugal Friend' paper trading platform. 
-    The user just received a '{status_key}' status for their simulated '{action_data['action']}' action on '{action_data['symbol']}'.
+    Users receive a '{status_key}' status for {subject}.
     
     INSTRUCTIONS:
-    1. Generate a single, concise, witty, and supportive post-transaction message (nudge).
-    2. If status is 'failure', the nudge should emphasize patience or learning.
-    3. If status is 'success', the nudge should emphasize discipline or long-term view.
+    1. Generate {count} different single-sentence, concise, witty, and supportive post-transaction messages (nudges).
+    2. If status is 'failure', the nudges should emphasize patience or learning.
+    3. If status is 'success', the nudges should emphasize discipline or long-term view.
+    4. Output one nudge per line, with no numbering, bullets or extra text.
     """
-    
-    # Generate the witty advice using Gemini
-    try:
-        response = client.models.generate_content(
-            model=MODEL, 
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.6) # Increased creativity
-        )
-        witty_advice = response.text.strip()
-    except Exception:
-        # Fallback if AI call fails
-        witty_advice = "Simulator response delayed. Great job testing our systems!"
+
+class NudgePool:
+    """
+    Pre-generated trade nudges keyed by (action, status, asset_type).
+    take() never calls the LLM: it rotates through the key's nudges (no repeats until all have
+    been shown) and, after NUDGE_POOL_MAX_SERVES serves, regenerates that key in the background
+    with one LLM call. New keys start from STATIC_NUDGES and are generated on first use.
+    """
+
+    def __init__(self):
+        self._pools: Dict[tuple, deque] = {}
+        self._serves: Dict[tuple, int] = {}
+        self._refilling: set = set()
+        self._tasks: set = set() # Strong references so running refills aren't garbage collected
+
+    @staticmethod
+    def key(action: str, status_key: str, asset_type: Optional[str]) -> tuple:
+        action = action if action in ("Buy", "Sell", "Basket") else "Buy"
+        status_key = "failure" if status_key == "failure" and action != "Basket" else "success"
+        asset_type = asset_type if asset_type in NUDGE_ASSET_TYPES else "Other"
+        return (action, status_key, asset_type)
+
+    def take(self, action: str, status_key: str, asset_type: Optional[str] = None) -> str:
+        key = self.key(action, status_key, asset_type)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = deque(STATIC_NUDGES[key[:2]])
+            self._serves[key] = NUDGE_POOL_MAX_SERVES # Static seeds: swap in generated nudges right away
+
+        nudge = pool[0]
+        pool.rotate(-1)
+        self._serves[key] = self._serves.get(key, 0) + 1
+        if self._serves[key] >= NUDGE_POOL_MAX_SERVES:
+            self._schedule_refill(key)
+        return nudge
+
+    def _schedule_refill(self, key: tuple):
+        if key in self._refilling or not client:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # Called from sync code: the next async take() schedules it
+        self._refilling.add(key)
+        task = loop.create_task(self._refill(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, key: tuple):
+        try:
+            response = await _generate_content_async(
+                "execute_investment_simulation", # The pool serves that function's nudges
+                model=MODEL,
+                contents=_build_nudge_pool_prompt(*key, NUDGE_POOL_SIZE),
+                config=types.GenerateContentConfig(temperature=0.9) # Variety matters more than precision here
+            )
+            nudges = [line.strip(" -*\t") for line in response.text.splitlines() if line.strip(" -*\t")]
+            if nudges:
+                self._pools[key] = deque(nudges[:NUDGE_POOL_SIZE])
+        except Exception as e:
+            # Keep rotating the current nudges; retry after another full round of serves
+            print(f"Nudge pool refill failed for {key}: {e}")
+        finally:
+            self._serves[key] = 0
+            self._refilling.discard(key)
+
+nudge_pool = NudgePool()
+
+def execute_investment_simulation(user_id: int, action_data: Dict) -> Dict: 
+    """
+    Simulates a real-time investment transaction.
+    Returns a structured status update with a nudge from the pre-generated pool (no LLM wait).
+    """
+    outcome = _mock_trade_outcome(action_data)
+    witty_advice = nudge_pool.take(action_data['action'], outcome['status'], action_data.get('asset_type'))
 
     # 3. Return the structured result
     return {
-        "status": status_key, 
-        "message": msg,
+        "status": outcome['status'], 
+        "message": outcome['message'],
         "advice_nudge": witty_advice,
         "asset_bought": action_data['symbol']
     }
 
-def generate_next_lesson(user_data: Dict, lesson_index: int) -> Dict:
-    """
-    Generates a single personalized lesson and its required Proof-of-Concept assignment.
-    The lesson content is generated by the LLM, but the assignment criteria are hardcoded 
-    to ensure predictable backend checks.
-    """
-    # Check for Gemini client initialization failure
-    if not client: 
-        return {
-            "lesson_title": "System Offline", 
-            "lesson_content": "AI Coach is unavailable. Please check the API connection.", 
-            "assignment_text": "Check backend connection.", 
-            "unlock_criteria_key": "none", 
-            "lesson_number": lesson_index
-        }
-
-    # --- 1. Define POC Assignment and Criteria based on Index ---
-    # This dictionary maps the lesson index to the required POC activity.
-    ASSIGNMENTS = {
-        1: {
-            "topic": "Introduction to Financial Awareness: Fixed vs. Variable Spending", 
-            "criteria": "consecutive_logs_3", 
-            "instruction": "Your challenge: Log every expense (any amount) for the next 3 days straight to prove you've started the habit."
-        },
-        2: {
-            "topic": "The Power of Compounding Interest: Making Money Work", 
-            "criteria": "simulator_run_min_50", 
-            "instruction": "Your assignment: Go to the Investment Simulator and run a scenario with a monthly contribution of at least $50. Find your gain!"
-        },
-        3: {
-            "topic": "Mastering the Budget: The Zero-Based Audit", 
-            "criteria": "expense_categories_5", 
-            "instruction": "Your audit: Log at least one expense in five different categories to demonstrate you've considered all budgeting areas."
-        }
+async def execute_investment_simulation_async(user_id: int, action_data: Dict) -> Dict:
+    """Async variant of execute_investment_simulation (also lets the nudge pool refill in the background)."""
+    return execute_investment_simulation(user_id, action_data)
+
+# --- 1. Define POC Assignment and Criteria based on Index ---
+# This dictionary maps the lesson index to the required POC activity.
+ASSIGNMENTS = {
+    1: {
+        "topic": "Introduction to Financial Awareness: Fixed vs. Variable Spending", 
+        "criteria": "consecutive_logs_3", 
+        "instruction": "Your challenge: Log every expense (any amount) for the next 3 days straight to prove you've started the habit."
+    },
+    2: {
+        "topic": "The Power of Compounding Interest: Making Money Work", 
+        "criteria": "simulator_run_min_50", 
+        "instruction": "Your assignment: Go to the Investment Simulator and run a scenario with a monthly contribution of at least $50. Find your gain!"
+    },
+    3: {
+        "topic": "Mastering the Budget: The Zero-Based Audit", 
+        "criteria": "expense_categories_5", 
+        "instruction": "Your audit: Log at least one expense in five different categories to demonstrate you've considered all budgeting areas."
     }
-    
+}
+
+def _offline_lesson(lesson_index: int) -> Dict:
+    return {
+        "lesson_title": "System Offline", 
+        "lesson_content": "AI Coach is unavailable. Please check the API connection.", 
+        "assignment_text": "Check backend connection.", 
+        "unlock_criteria_key": "none", 
+        "lesson_number": lesson_index
+    }
+
+def _build_lesson_prompt(user_data: Dict, lesson_index: int):
+    """Returns (lesson_data, prompt) for the lesson index."""
     # Get the data for the current lesson index (defaults to Lesson 1 if index > 3 for MVP)
     lesson_data = ASSIGNMENTS.get(lesson_index, ASSIGNMENTS[1]) 
     
     topic = lesson_data['topic']
-    criteria_key = lesson_data['criteria']
-    instruction = lesson_data['instruction']
     
     # --- 2. Construct LLM Prompt to Generate Lesson Content ---
 
@@ -291,12 +506,37 @@ def generate_next_lesson(user_data: Dict, lesson_index: int) -> Dict:
     2.  The tone must be encouraging and match the user's confidence level.
     3.  Output ONLY the lesson content text, nothing else.
     """
+    return lesson_data, prompt
+
+def _lesson_result(lesson_data: Dict, generated_lesson_text: str, lesson_index: int) -> Dict:
+    # --- 4. Return the structured result ---
+    # This structure is easily parsed by Mallika's frontend
+    return {
+        "lesson_title": lesson_data['topic'], 
+        "lesson_content": generated_lesson_text, 
+        "assignment_text": lesson_data['instruction'], 
+        "unlock_criteria_key": lesson_data['criteria'], # Key used by Muneer's frontend logic
+        "lesson_number": lesson_index
+    }
+
+def generate_next_lesson(user_data: Dict, lesson_index: int) -> Dict:
+    """
+    Generates a single personalized lesson and its required Proof-of-Concept assignment.
+    The lesson content is generated by the LLM, but the assignment criteria are hardcoded 
+    to ensure predictable backend checks.
+    """
+    # Check for Gemini client initialization failure
+    if not client: 
+        return _offline_lesson(lesson_index)
+
+    lesson_data, prompt = _build_lesson_prompt(user_data, lesson_index)
     
     # --- 3. Call LLM to generate the content ---
     
     # Use gemini-2.5-pro for better adherence to complex instructions
     try:
-        response = client.models.generate_content(
+        response = _generate_content(
+            "generate_next_lesson",
             model='gemini-2.5-pro', 
             contents=prompt
         )
@@ -305,12 +545,23 @@ def generate_next_lesson(user_data: Dict, lesson_index: int) -> Dict:
         # Fallback if AI API call fails during the hackathon
         generated_lesson_text = f"Error generating content: {e}. Focus on the assignment below!"
 
-    # --- 4. Return the structured result ---
-    # This structure is easily parsed by Mallika's frontend
-    return {
-        "lesson_title": topic, 
-        "lesson_content": generated_lesson_text, 
-        "assignment_text": instruction, 
-        "unlock_criteria_key": criteria_key, # Key used by Muneer's frontend logic
-        "lesson_number": lesson_index
-    }
\ No newline at end of file
+    return _lesson_result(lesson_data, generated_lesson_text, lesson_index)
+
+async def generate_next_lesson_async(user_data: Dict, lesson_index: int) -> Dict:
+    """Async variant of generate_next_lesson."""
+    if not client: 
+        return _offline_lesson(lesson_index)
+
+    lesson_data, prompt = _build_lesson_prompt(user_data, lesson_index)
+
+    try:
+        response = await _generate_content_async(
+            "generate_next_lesson",
+            model='gemini-2.5-pro', 
+            contents=prompt
+        )
+        generated_lesson_text = response.text.strip()
+    except Exception as e:
+        generated_lesson_text = f"Error generating content: {e}. Focus on the assignment below!"
+
+    return _lesson_result(lesson_data, generated_lesson_text, lesson_index)
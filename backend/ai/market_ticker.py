@@ -0,0 +1,148 @@
+# ai/market_ticker.py (Mock market tick engine with WebSocket fan-out)
+
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Set, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from ai.price_store import ASSET_LIST, PRICE_SEED, SYMBOL_INDEX, load_price_store
+
+load_dotenv()
+MARKET_TICK_SECONDS = float(os.getenv("MARKET_TICK_SECONDS", 5))
+# Standard deviation of each tick's log return (0.0002 at 5s ticks is roughly 2.6% a day)
+MARKET_TICK_VOLATILITY = float(os.getenv("MARKET_TICK_VOLATILITY", 0.0002))
+
+class MarketTicker:
+    """
+    Advances every symbol in ASSET_LIST with a vectorized random walk.
+
+    The walk is a pure function of (PRICE_SEED, UTC day, tick index): each day opens at the
+    price store's latest history point and the whole day's path is drawn in one cumsum. So
+    every worker quotes the same price for the same tick, nothing is replayed at startup, and
+    HTTP routes can read the current price without the background loop running.
+    The loop only pushes ticks: each one is computed and serialized once, then handed to
+    every WebSocket subscriber.
+    """
+
+    def __init__(self, interval: float = MARKET_TICK_SECONDS, volatility: float = MARKET_TICK_VOLATILITY, seed: int = PRICE_SEED):
+        self.interval = interval
+        self.volatility = volatility
+        self.seed = seed
+        self.ticks_per_day = max(1, int(86400 // interval))
+        self._lock = threading.Lock()
+        self._path_day: Optional[date] = None
+        self._path: Optional[np.ndarray] = None # (ticks_per_day, symbols) cumulative log returns
+        self._tick = -1
+        self._prices: Optional[np.ndarray] = None
+        self._snapshot: Dict = {}
+        self._payload = ""
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._published = -1
+
+    def _tick_at(self, now: float) -> Tuple[date, int]:
+        day = datetime.fromtimestamp(now, tz=timezone.utc).date()
+        return day, min(int((now % 86400) // self.interval), self.ticks_per_day - 1)
+
+    def _day_path(self, day: date) -> np.ndarray:
+        if self._path_day != day:
+            rng = np.random.default_rng([self.seed, day.toordinal()])
+            path = rng.standard_normal((self.ticks_per_day, len(ASSET_LIST)))
+            path *= self.volatility
+            np.cumsum(path, axis=0, out=path)
+            self._path, self._path_day = path, day
+        return self._path
+
+    def _refresh(self):
+        """Recomputes the snapshot if the wall clock has moved on to a new tick (at most once per tick)."""
+        day, index = self._tick_at(time.time())
+        tick = day.toordinal() * self.ticks_per_day + index
+        with self._lock:
+            if tick == self._tick:
+                return
+            prices = np.round(load_price_store()[:, -1] * np.exp(self._day_path(day)[index]), 2)
+            prices.flags.writeable = False
+            as_of = datetime.combine(day, datetime.min.time()) + timedelta(seconds=index * self.interval)
+            self._snapshot = {
+                "tick": tick,
+                "as_of": as_of.isoformat() + "Z",
+                "prices": dict(zip(ASSET_LIST, prices.tolist()))
+            }
+            self._payload = json.dumps(self._snapshot)
+            self._prices, self._tick = prices, tick
+
+    def snapshot(self) -> Dict:
+        """Current tick as {'tick', 'as_of', 'prices': {symbol: price}}."""
+        self._refresh()
+        return self._snapshot
+
+    def payload(self) -> str:
+        """The current snapshot, already serialized (shared by every subscriber)."""
+        self._refresh()
+        return self._payload
+
+    @property
+    def tick(self) -> int:
+        self._refresh()
+        return self._tick
+
+    def quote(self) -> Tuple[int, np.ndarray]:
+        """(tick, prices) for every symbol, indexed like ASSET_LIST. The array is read-only and replaced, never mutated."""
+        self._refresh()
+        with self._lock:
+            return self._tick, self._prices
+
+    def price(self, symbol: str) -> Optional[float]:
+        """Current price for a symbol, or None if it is not traded."""
+        index = SYMBOL_INDEX.get(symbol)
+        if index is None:
+            return None
+        self._refresh()
+        return float(self._prices[index])
+
+    # --- Fan-out ---
+
+    def subscribe(self) -> asyncio.Queue:
+        # maxsize=1: a slow client only ever has the latest tick waiting, never a backlog
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, payload: str):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait() # Drop the stale tick the client hasn't picked up yet
+            queue.put_nowait(payload)
+
+    async def _run(self):
+        while True:
+            # Wake just after each tick boundary so the refresh lands on the new tick
+            await asyncio.sleep(self.interval - time.time() % self.interval + 0.01)
+            payload = self.payload()
+            if self._subscribers and self._tick != self._published:
+                self._publish(payload)
+                self._published = self._tick
+
+    def start(self):
+        """Starts the push loop on the running event loop (no-op if it is already running there)."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done() and self._task.get_loop() is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+market_ticker = MarketTicker()
@@ -0,0 +1,111 @@
+# ai/price_store.py (Deterministic mock price history, shared by all workers through a memory-mapped file)
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+ASSET_LIST = [
+    "AAPL", "GOOG", "MSFT", "TSLA", "AMZN",
+    "VTI", "VOO", "SBUX", "DIS", "JNJ",
+    "GOLD_ETF", "US_BONDS", "IND_FUND"
+]
+HISTORY_DAYS = 10
+PRICE_SEED = int(os.getenv("PRICE_SEED", 42))
+PRICE_STORE_PATH = os.getenv("PRICE_STORE_PATH", os.path.join(tempfile.gettempdir(), "finity_prices.bin"))
+
+# File layout: header, then a float64 matrix of shape (len(ASSET_LIST), HISTORY_DAYS), oldest day first
+_MAGIC = b"FNTYPRC1"
+_HEADER = struct.Struct("<8sIIQ8s") # magic, n_symbols, n_days, seed, symbol-list digest
+SYMBOL_INDEX = {symbol: i for i, symbol in enumerate(ASSET_LIST)}
+
+_prices: Optional[np.ndarray] = None
+_lock = threading.Lock()
+
+def _stable_hash(symbol: str) -> int:
+    """Process-independent replacement for hash(symbol) (which is randomized per process)."""
+    return int.from_bytes(hashlib.sha256(symbol.encode()).digest()[:8], "big")
+
+def _symbols_digest() -> bytes:
+    return hashlib.sha256(",".join(ASSET_LIST).encode()).digest()[:8]
+
+def generate_price_history(seed: int = PRICE_SEED) -> np.ndarray:
+    """
+    Builds the (symbols x days) price matrix: same shape of walk as the old per-symbol generator
+    (unique base price and volatility per symbol, floored at 95% of base), but seeded and
+    vectorized across symbols so every process computes identical prices.
+    """
+    hashes = np.array([_stable_hash(s) for s in ASSET_LIST], dtype=np.uint64)
+    base = 150.0 + (hashes % 100).astype(np.float64) # Unique base price
+    volatility = 1.0 + (hashes % 3).astype(np.float64) / 2 # Unique volatility
+
+    rng = np.random.default_rng(seed)
+    changes = rng.uniform(-1.0, 1.0, size=(len(ASSET_LIST), HISTORY_DAYS)) * volatility[:, None]
+
+    prices = np.empty((len(ASSET_LIST), HISTORY_DAYS))
+    current = base.copy()
+    for day in range(HISTORY_DAYS):
+        current = np.maximum(current + changes[:, day], base * 0.95) # Keep price realistic
+        prices[:, day] = current
+    return np.round(prices, 2)
+
+def _header_bytes(seed: int) -> bytes:
+    return _HEADER.pack(_MAGIC, len(ASSET_LIST), HISTORY_DAYS, seed, _symbols_digest())
+
+def _publish(path: str, seed: int):
+    """Writes the store atomically (temp file + rename) so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".finity_prices.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_header_bytes(seed))
+            f.write(generate_price_history(seed).astype("<f8").tobytes())
+        os.chmod(tmp_path, 0o644) # mkstemp creates 0600; workers may run as another user
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _is_current(path: str, seed: int) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(_HEADER.size) == _header_bytes(seed)
+    except OSError:
+        return False
+
+def load_price_store(path: str = PRICE_STORE_PATH, seed: int = PRICE_SEED) -> np.ndarray:
+    """
+    Maps the shared price file read-only (zero-copy: every worker shares the same page cache).
+    The file is only (re)generated when missing or built for a different seed / asset list.
+    """
+    global _prices
+    with _lock:
+        if _prices is None:
+            if not _is_current(path, seed):
+                _publish(path, seed)
+            _prices = np.memmap(path, dtype="<f8", mode="r", offset=_HEADER.size, shape=(len(ASSET_LIST), HISTORY_DAYS))
+        return _prices
+
+def get_price_history(symbol: str) -> List[Dict]:
+    """The 10-day history for a symbol as [{'date', 'price'}] (ending today), or [] if unknown."""
+    index = SYMBOL_INDEX.get(symbol)
+    if index is None:
+        return []
+    row = load_price_store()[index]
+    today = date.today()
+    return [
+        {"date": (today - timedelta(days=HISTORY_DAYS - 1 - day)).isoformat(), "price": float(row[day])}
+        for day in range(HISTORY_DAYS)
+    ]
+
+def get_latest_price(symbol: str) -> Optional[float]:
+    """Latest history point for a symbol, or None if it is not in the store."""
+    index = SYMBOL_INDEX.get(symbol)
+    return None if index is None else float(load_price_store()[index, -1])
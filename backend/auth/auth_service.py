@@ -1,21 +1,57 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
+import atexit
+import hashlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 # Change the import logic - bcrypt is no longer used directly in the context definition
 from passlib.context import CryptContext 
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import os
 from database.schemas import TokenData
+from utils.cache import ExpiringSet, TTLCache
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# PBKDF2 work factor. 29000 is passlib's pbkdf2_sha256 default, so existing hashes stay current.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 29000))
+# Processes that run hashing off the request threadpool (0 = hash inline in the threadpool)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Hash jobs allowed queued or running at once; past that, signup/login answer 503 instead of piling up
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+# min == max == default rounds: any hash made with another work factor "needs update" and is rehashed at login
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"], deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_HASH_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Verified tokens (by SHA-256 digest) -> claims, so a token's signature is checked once, not on
+# every request. Entries never outlive the token's own `exp`.
+TOKEN_CACHE = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_MAX_SIZE", 4096)),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 300))
+)
+# Digests of logged-out tokens. Each is kept until the token's own `exp` passes (forever for a token
+# without one) and never evicted for space, so a revocation cannot lapse while the token is still valid.
+# NOTE: logout is per-worker. REVOKED_TOKENS lives in process memory, so with several uvicorn
+# workers a logged-out token is only rejected by the worker that handled /logout; the others accept
+# it until it expires (at most ACCESS_TOKEN_EXPIRE_MINUTES). Run one worker per host if that matters.
+REVOKED_TOKENS = ExpiringSet()
+
 def get_password_hash(password: str) -> str:
     """Hashes a plaintext password securely using PBKDF2_SHA256."""
     # We no longer need truncation logic, as PBKDF2_SHA256 handles arbitrary lengths
@@ -25,6 +61,51 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plaintext password against the stored hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash): new_hash is set when the stored hash uses an outdated work factor."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# --- Password hashing pool: PBKDF2 is CPU-bound and holds the GIL, so it runs in separate processes ---
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    """Lazily started, process-wide pool. Workers are spawned, not forked: forking this threaded process could deadlock the child on a lock held mid-fork."""
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_hash_pool.shutdown, wait=False, cancel_futures=True)
+    return _hash_pool
+
+async def _run_hash_job(fn, *args):
+    """Runs a hash job in the pool, or raises 503 right away if PASSWORD_HASH_MAX_PENDING jobs are already in flight."""
+    global _hash_pool
+    saturated = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins right now, please retry in a moment.",
+        headers={"Retry-After": "1"},
+    )
+    if not _hash_slots.acquire(blocking=False):
+        raise saturated
+    try:
+        if PASSWORD_HASH_WORKERS <= 0:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.wrap_future(_get_hash_pool().submit(fn, *args))
+    except BrokenProcessPool:
+        _hash_pool = None # A worker died: the next job starts a fresh pool
+        raise saturated
+    finally:
+        _hash_slots.release()
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash, run in the hashing pool."""
+    return await _run_hash_job(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password, run in the hashing pool."""
+    return await _run_hash_job(verify_and_update_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -36,19 +117,55 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user_email(token: str = Depends(oauth2_scheme)) -> str:
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _seconds_until(exp) -> float:
+    return float(exp) - time.time() if exp is not None else float("inf")
+
+def _verify_token(token: str, digest: str) -> tuple:
+    """(TokenData, exp) for a valid, non-revoked token; raises the 401 credentials exception otherwise."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if digest in REVOKED_TOKENS:
+        raise credentials_exception
+
+    cached = TOKEN_CACHE.get(digest)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-            
-        return email
-        
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+    verified = (TokenData(email=email, user_id=payload.get("uid")), payload.get("exp"))
+    remaining = _seconds_until(verified[1])
+    if remaining > 0:
+        TOKEN_CACHE.set(digest, verified, ttl=min(TOKEN_CACHE.ttl, remaining))
+    return verified
+
+def decode_token(token: str) -> TokenData:
+    """Verifies a JWT and returns its claims. TOKEN_CACHE skips the signature check for tokens seen recently."""
+    return _verify_token(token, _token_digest(token))[0]
+
+def revoke_token(token: str) -> TokenData:
+    """Logs a token out (on this worker only, see REVOKED_TOKENS): it is rejected from now until it expires."""
+    digest = _token_digest(token)
+    token_data, exp = _verify_token(token, digest)
+    REVOKED_TOKENS.add(digest, exp)
+    TOKEN_CACHE.invalidate(digest)
+    return token_data
+
+def get_current_token_data(token: str = Depends(oauth2_scheme)) -> TokenData:
+    """Decodes the JWT and returns its claims ('sub' email and, for newer tokens, the 'uid' user id)."""
+    return decode_token(token)
+
+def get_current_user_email(token_data: TokenData = Depends(get_current_token_data)) -> str:
+    return token_data.email
\ No newline at end of file
@@ -0,0 +1,43 @@
+# auth/dependencies.py (FastAPI dependencies that need both auth and the database)
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_db, get_async_db
+from database import crud, schemas
+from auth.auth_service import get_current_token_data, decode_token, oauth2_scheme
+
+def get_current_user(
+    token_data: schemas.TokenData = Depends(get_current_token_data),
+    db: Session = Depends(get_db)
+) -> schemas.User:
+    """
+    Resolves the authenticated user in (usually) zero queries.
+    Tokens carry the user id ('uid'), which is looked up in crud.USER_CACHE; the DB is only
+    queried on a cache miss. Legacy tokens without 'uid' fall back to a lookup by email.
+    """
+    user_id = token_data.user_id
+    if user_id is None:
+        db_user = crud.get_user_by_email(db, email=token_data.email)
+        user_id = db_user.id if db_user else None
+
+    user = crud.get_cached_user(db, user_id) if user_id is not None else None
+    if user is None or user.email != token_data.email:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> schemas.User:
+    """Async variant of get_current_user for `async def` routes: auth never hops to the threadpool."""
+    token_data = decode_token(token)
+    user_id = token_data.user_id
+    if user_id is None:
+        db_user = await crud.get_user_by_email_async(db, email=token_data.email)
+        user_id = db_user.id if db_user else None
+
+    user = await crud.get_cached_user_async(db, user_id) if user_id is not None else None
+    if user is None or user.email != token_data.email:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
@@ -1,15 +1,29 @@
 # database/crud.py (Production Ready Code)
 
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
 from auth.auth_service import get_password_hash, verify_password # Centralized security service
-from typing import List
+from typing import List, Dict
 from datetime import date, timedelta, datetime
 from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import Date
-from ai.coach_agent import STATIC_ASSET_HISTORY
+from sqlalchemy import Date, insert, tuple_, select, func, cast, update, case
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ai.market_ticker import market_ticker
+from ai.price_store import SYMBOL_INDEX
+import numpy as np
 from fastapi import HTTPException, status
+from utils.cache import TTLCache
+import os
+
+# Per-process cache of user snapshots (keyed by user id) used by the auth dependency.
+# Writers that change user rows MUST call invalidate_cached_user().
+USER_CACHE = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_MAX_SIZE", 1024)),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+)
 
 # --- USER CRUD (Read and Create) ---
 
@@ -17,19 +31,75 @@ def get_user_by_email(db: Session, email: str):
     """Fetches a user by their unique email."""
     return db.query(models.User).filter(models.User.email == email).first()
 
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """Async variant of get_user_by_email."""
+    return (await db.scalars(select(models.User).where(models.User.email == email).limit(1))).first()
+
 def get_user_by_id(db: Session, user_id: int):
     """Fetches a user by their primary key ID."""
     return db.query(models.User).filter(models.User.id == user_id).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    """Creates a user and securely hashes the password."""
-    hashed_password = get_password_hash(user.password)
+async def get_user_by_id_async(db: AsyncSession, user_id: int):
+    """Async variant of get_user_by_id."""
+    return await db.get(models.User, user_id)
+
+def get_cached_user(db: Session, user_id: int) -> Optional[schemas.User]:
+    """
+    Returns a detached snapshot of the user, served from USER_CACHE when possible.
+    Only hits the database on a cache miss (or after the entry expires / is invalidated).
+    """
+    cached = USER_CACHE.get(user_id)
+    if cached is not None:
+        return cached
+
+    db_user = get_user_by_id(db, user_id)
+    if db_user is None:
+        return None
+
+    # Cache a Pydantic snapshot, NOT the ORM object: ORM instances are bound to (and expired by) their session.
+    snapshot = schemas.User.model_validate(db_user)
+    USER_CACHE.set(user_id, snapshot)
+    return snapshot
+
+async def get_cached_user_async(db: AsyncSession, user_id: int) -> Optional[schemas.User]:
+    """Async variant of get_cached_user (same USER_CACHE)."""
+    cached = USER_CACHE.get(user_id)
+    if cached is not None:
+        return cached
+
+    db_user = await get_user_by_id_async(db, user_id)
+    if db_user is None:
+        return None
+
+    snapshot = schemas.User.model_validate(db_user)
+    USER_CACHE.set(user_id, snapshot)
+    return snapshot
+
+def invalidate_cached_user(user_id: int):
+    """Drops the cached snapshot so the next request re-reads the user row."""
+    USER_CACHE.invalidate(user_id)
+
+# Per-user holdings (as arrays) plus the valuation for the last price tick they were valued at.
+# Trades invalidate the entry; the TTL bounds staleness for trades made on another worker.
+PORTFOLIO_CACHE = TTLCache(
+    maxsize=int(os.getenv("PORTFOLIO_CACHE_MAX_SIZE", 1024)),
+    ttl=float(os.getenv("PORTFOLIO_CACHE_TTL_SECONDS", 60))
+)
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    """Creates a user and securely hashes the password (pass `hashed_password` if it was already hashed, e.g. in the hashing pool)."""
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db.commit() # The id comes back from the INSERT itself (RETURNING / lastrowid): no refresh needed
     return db_user
 
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    """Replaces a user's stored hash (used to upgrade it after a work-factor change)."""
+    db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+
 # --- ONBOARDING & GOAL CRUD (Create and Update) ---
 
 def update_onboarding_data(db: Session, user_id: int, data: schemas.OnboardingData):
@@ -65,7 +135,7 @@ def update_onboarding_data(db: Session, user_id: int, data: schemas.OnboardingDa
         db.add(db_goal)
         
     db.commit()
-    db.refresh(db_user)
+    invalidate_cached_user(user_id)
     return db_user
     
 def get_user_goals(db: Session, user_id: int) -> List[models.Goal]:
@@ -93,6 +163,11 @@ def create_expense(db: Session, expense: schemas.ExpenseCreate, user_id: int):
     if expense_data.get('note') is None:
         del expense_data['note']
     
+    # Keep the materialized streak counters in step (locks the user row so concurrent inserts serialize)
+    db_user = db.query(models.User).filter(models.User.id == user_id).with_for_update().first()
+    if db_user:
+        _apply_expense_to_streak(db, db_user, expense_data['date'].date())
+
     # Instantiate the model, carefully passing only required arguments
     db_expense = models.Expense(
         amount=expense_data['amount'],
@@ -103,10 +178,330 @@ def create_expense(db: Session, expense: schemas.ExpenseCreate, user_id: int):
     )
     
     db.add(db_expense)
+    add_to_expense_rollup(db, user_id, [db_expense.date], [db_expense.category], [db_expense.amount])
     db.commit()
-    db.refresh(db_expense)
     return db_expense
 
+async def create_expense_async(db: AsyncSession, expense: schemas.ExpenseCreate, user_id: int):
+    """
+    Async variant of create_expense. The streak/rollup logic runs unchanged through run_sync,
+    which drives the async connection from the sync code (no threadpool involved).
+    """
+    return await db.run_sync(create_expense, expense, user_id)
+
+# --- LOGGING STREAK (Materialized counters) ---
+
+# How many days of expense history to read per query when walking a run of logged days
+STREAK_SCAN_WINDOW_DAYS = 31
+
+def _logged_days_between(db: Session, user_id: int, first_day: date, last_day: date) -> set:
+    """Distinct days in [first_day, last_day] on which the user logged an expense."""
+    rows = db.query(models.Expense.date).filter(
+        models.Expense.owner_id == user_id,
+        models.Expense.date >= datetime.combine(first_day, datetime.min.time()),
+        models.Expense.date < datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    ).all()
+    return {r[0].date() for r in rows}
+
+def _count_logged_run(db: Session, user_id: int, start_day: date, step: int) -> int:
+    """Counts consecutive logged days from start_day, moving `step` (-1 or +1) days at a time."""
+    count = 0
+    day = start_day
+    while True:
+        window_end = day + timedelta(days=step * (STREAK_SCAN_WINDOW_DAYS - 1))
+        logged = _logged_days_between(db, user_id, min(day, window_end), max(day, window_end))
+        for _ in range(STREAK_SCAN_WINDOW_DAYS):
+            if day not in logged:
+                return count
+            count += 1
+            day += timedelta(days=step)
+
+def _apply_expense_to_streak(db: Session, db_user: models.User, day: date):
+    """
+    Updates current_streak / longest_streak / last_logged_date for a new expense on `day`.
+    Must run BEFORE the new expense is added to the session (so the queries below don't see it).
+    """
+    last = db_user.last_logged_date
+    current = db_user.current_streak or 0
+
+    if last is None or day > last:
+        # Newest day so far: extends the run if it is the next day, otherwise starts a new one
+        current = current + 1 if last is not None and day == last + timedelta(days=1) else 1
+        db_user.last_logged_date = day
+        run = current
+    elif day >= last - timedelta(days=current - 1):
+        return # Already inside the current run
+    elif _logged_days_between(db, db_user.id, day, day):
+        return # Back-dated, but that day was already logged
+    else:
+        # Back-dated expense on a new day: it may close a gap and join two runs
+        before = _count_logged_run(db, db_user.id, day - timedelta(days=1), -1)
+        after = _count_logged_run(db, db_user.id, day + timedelta(days=1), +1)
+        run = before + 1 + after
+        if day + timedelta(days=after) == last:
+            current = run # The joined run reaches the latest day, so it is the current run
+
+    db_user.current_streak = current
+    db_user.longest_streak = max(db_user.longest_streak or 0, run, current)
+
+def get_logging_streak(db: Session, user_id: int) -> int:
+    """
+    The user's current streak as of today, from the materialized counters (a primary key lookup
+    instead of a scan of the whole expense history). Same result as calculate_consecutive_days_logged.
+    """
+    row = db.query(models.User.current_streak, models.User.last_logged_date).filter(
+        models.User.id == user_id
+    ).first()
+    if not row or row.last_logged_date is None:
+        return 0
+
+    today = date.today()
+    if row.last_logged_date == today:
+        return row.current_streak
+    if row.last_logged_date > today:
+        # Future-dated expenses: the counters run ahead of the calendar, so use the scan
+        return calculate_consecutive_days_logged(db, user_id)
+    return 0
+
+async def get_logging_streak_async(db: AsyncSession, user_id: int) -> int:
+    """Async variant of get_logging_streak."""
+    row = (await db.execute(
+        select(models.User.current_streak, models.User.last_logged_date).where(models.User.id == user_id)
+    )).first()
+    if not row or row.last_logged_date is None:
+        return 0
+
+    today = date.today()
+    if row.last_logged_date == today:
+        return row.current_streak
+    if row.last_logged_date > today:
+        return await db.run_sync(calculate_consecutive_days_logged, user_id)
+    return 0
+
+def recompute_logging_streak(db: Session, user_id: int) -> Dict:
+    """Full-history recomputation of the streak counters (backfill and consistency checks only)."""
+    rows = db.query(models.Expense.date).filter(
+        models.Expense.owner_id == user_id,
+        models.Expense.date.isnot(None)
+    ).all()
+    days = sorted({r[0].date() for r in rows})
+
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+
+    return {"current_streak": current, "longest_streak": longest, "last_logged_date": previous}
+
+# --- BULK IMPORT (Single transaction, multi-row INSERTs) ---
+
+def _entry_datetime(entry_date: Optional[date]) -> datetime:
+    """Same date handling as create_expense/create_income: midnight of the given day, else now."""
+    return datetime.combine(entry_date, datetime.min.time()) if entry_date else datetime.utcnow()
+
+def expense_row(expense: schemas.ExpenseCreate, user_id: int) -> Dict:
+    """Column values for one imported expense."""
+    return {
+        "amount": expense.amount,
+        "category": expense.category,
+        "note": expense.note,
+        "date": _entry_datetime(expense.date),
+        "owner_id": user_id
+    }
+
+def income_row(income: schemas.IncomeCreate, user_id: int) -> Dict:
+    """Column values for one imported income."""
+    return {
+        "amount": income.amount,
+        "source": income.source,
+        "date": _entry_datetime(income.date),
+        "owner_id": user_id
+    }
+
+def bulk_insert_expenses(db: Session, rows: List[Dict]):
+    """Inserts a chunk of expense rows as one multi-row INSERT (plus its rollup deltas). Does NOT commit."""
+    db.execute(insert(models.Expense), rows)
+    add_to_expense_rollup(
+        db, rows[0]["owner_id"],
+        [r["date"] for r in rows], [r["category"] for r in rows], [r["amount"] for r in rows]
+    )
+
+def bulk_insert_incomes(db: Session, rows: List[Dict]):
+    """Inserts a chunk of income rows as one multi-row INSERT. Does NOT commit."""
+    db.execute(insert(models.Income), rows)
+
+def finish_expense_import(db: Session, user_id: int):
+    """Refreshes the streak counters once for the whole import, then commits the transaction."""
+    db.flush()
+    counters = recompute_logging_streak(db, user_id)
+    db.query(models.User).filter(models.User.id == user_id).update(counters)
+    db.commit()
+
+# --- SPENDING AGGREGATION (Monthly rollup + SQL GROUP BY) ---
+
+def _period_bucket(db: Session, column, period: str):
+    """SQL expression truncating a datetime column to the start of its day / week (Monday) / month."""
+    if db.get_bind().dialect.name == "sqlite":
+        modifiers = {"day": (), "week": ("weekday 0", "-6 days"), "month": ("start of month",)}[period]
+        return func.date(column, *modifiers)
+    if period == "day":
+        return cast(column, Date)
+    return cast(func.date_trunc(period, column), Date)
+
+def _as_date(value) -> date:
+    """Normalizes a bucket value (date, datetime or SQLite 'YYYY-MM-DD' string) to a date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+def add_to_expense_rollup(db: Session, user_id: int, dates: List[datetime], categories: List[str], amounts: List[float]):
+    """
+    Adds expenses to expense_monthly_rollup with one INSERT ... ON CONFLICT DO UPDATE.
+    Runs inside the caller's transaction (does NOT commit).
+    """
+    deltas: Dict[tuple, List[float]] = {}
+    for entry_date, category, amount in zip(dates, categories, amounts):
+        key = (entry_date.date().replace(day=1), category)
+        total_count = deltas.setdefault(key, [0.0, 0])
+        total_count[0] += amount
+        total_count[1] += 1
+
+    rows = [
+        {"user_id": user_id, "month": month, "category": category, "total": total, "count": count}
+        for (month, category), (total, count) in deltas.items()
+    ]
+    if not rows:
+        return
+
+    table = models.ExpenseMonthlyRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        # No portable upsert: read-modify-write (fine for the dev/test dialects this would hit)
+        for row in rows:
+            existing = db.get(models.ExpenseMonthlyRollup, (row["user_id"], row["month"], row["category"]))
+            if existing:
+                existing.total += row["total"]
+                existing.count += row["count"]
+            else:
+                db.add(models.ExpenseMonthlyRollup(**row))
+        return
+
+    upsert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    stmt = upsert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.month, table.c.category],
+        set_={"total": table.c.total + stmt.excluded.total, "count": table.c.count + stmt.excluded.count}
+    )
+    db.execute(stmt)
+
+def rebuild_expense_rollup(db: Session, user_id: Optional[int] = None):
+    """Recomputes the rollup from raw expenses (all users, or one) with INSERT ... SELECT ... GROUP BY. Commits."""
+    rollup = models.ExpenseMonthlyRollup
+    delete_query = db.query(rollup)
+    if user_id is not None:
+        delete_query = delete_query.filter(rollup.user_id == user_id)
+    delete_query.delete(synchronize_session=False)
+
+    month = _period_bucket(db, models.Expense.date, "month")
+    source = select(
+        models.Expense.owner_id, month, models.Expense.category,
+        func.sum(models.Expense.amount), func.count(models.Expense.id)
+    ).where(models.Expense.owner_id.isnot(None), models.Expense.date.isnot(None))
+    if user_id is not None:
+        source = source.where(models.Expense.owner_id == user_id)
+    source = source.group_by(models.Expense.owner_id, month, models.Expense.category)
+
+    db.execute(insert(rollup.__table__).from_select(["user_id", "month", "category", "total", "count"], source))
+    db.commit()
+
+def get_spending_summary(db: Session, user_id: int, period: str, start_date: date, end_date: date) -> Dict:
+    """
+    Per-category and per-period spending totals, aggregated by the database.
+    - period == 'month': GROUP BY over expense_monthly_rollup (whole months; raw expenses are never read).
+    - period == 'day' / 'week': GROUP BY over expenses for the date range, via the (owner_id, date) index.
+    """
+    if period == "month":
+        rollup = models.ExpenseMonthlyRollup
+        start_date = start_date.replace(day=1)
+        rows = db.query(rollup.month, rollup.category, func.sum(rollup.total), func.sum(rollup.count)).filter(
+            rollup.user_id == user_id,
+            rollup.month >= start_date,
+            rollup.month <= end_date.replace(day=1)
+        ).group_by(rollup.month, rollup.category).all()
+    else:
+        bucket = _period_bucket(db, models.Expense.date, period)
+        rows = db.query(bucket, models.Expense.category, func.sum(models.Expense.amount), func.count(models.Expense.id)).filter(
+            models.Expense.owner_id == user_id,
+            models.Expense.date >= datetime.combine(start_date, datetime.min.time()),
+            models.Expense.date < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        ).group_by(bucket, models.Expense.category).all()
+
+    # Fold the (period, category) groups into both views; this is at most periods x categories rows
+    by_category: Dict[str, Dict] = {}
+    by_period: Dict[date, Dict] = {}
+    for bucket_value, category, total, count in rows:
+        total, count = float(total or 0.0), int(count or 0)
+        cat = by_category.setdefault(category, {"category": category, "total": 0.0, "count": 0})
+        cat["total"] += total
+        cat["count"] += count
+        per = by_period.setdefault(_as_date(bucket_value), {"period_start": _as_date(bucket_value), "total": 0.0, "count": 0, "categories": {}})
+        per["total"] += total
+        per["count"] += count
+        per["categories"][category] = round(per["categories"].get(category, 0.0) + total, 2)
+
+    for entry in list(by_category.values()) + list(by_period.values()):
+        entry["total"] = round(entry["total"], 2)
+
+    return {
+        "period": period,
+        "start_date": start_date,
+        "end_date": end_date,
+        "total": round(sum(c["total"] for c in by_category.values()), 2),
+        "by_category": sorted(by_category.values(), key=lambda c: c["total"], reverse=True),
+        "by_period": [by_period[k] for k in sorted(by_period)]
+    }
+
+# --- HISTORY PAGES (Keyset pagination) ---
+
+def _history_page(db: Session, model, columns, user_id: int, limit: int, after: Optional[tuple],
+                  start_date: Optional[date], end_date: Optional[date], filters=()):
+    """
+    One page of a user's history, newest first, ordered by (date, id).
+    `after` is the (date, id) of the last row already seen: seeking past it uses the
+    (owner_id, date) index, so every page costs the same regardless of depth (no OFFSET).
+    Fetches limit + 1 rows to tell whether another page exists.
+    """
+    query = db.query(*columns).filter(model.owner_id == user_id, *filters)
+    if start_date:
+        query = query.filter(model.date >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.filter(model.date < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    if after:
+        query = query.filter(tuple_(model.date, model.id) < tuple_(*after))
+
+    rows = query.order_by(model.date.desc(), model.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def get_user_expenses_page(db: Session, user_id: int, limit: int = 50, after: Optional[tuple] = None,
+                           start_date: Optional[date] = None, end_date: Optional[date] = None,
+                           category: Optional[str] = None):
+    """Keyset page of expenses (lean projection: no owner/relationship columns)."""
+    columns = (models.Expense.id, models.Expense.amount, models.Expense.category, models.Expense.note, models.Expense.date)
+    filters = (models.Expense.category == category,) if category else ()
+    return _history_page(db, models.Expense, columns, user_id, limit, after, start_date, end_date, filters)
+
+def get_user_incomes_page(db: Session, user_id: int, limit: int = 50, after: Optional[tuple] = None,
+                          start_date: Optional[date] = None, end_date: Optional[date] = None,
+                          source: Optional[str] = None):
+    """Keyset page of incomes (lean projection)."""
+    columns = (models.Income.id, models.Income.amount, models.Income.source, models.Income.date)
+    filters = (models.Income.source == source,) if source else ()
+    return _history_page(db, models.Income, columns, user_id, limit, after, start_date, end_date, filters)
+
 def get_user_expenses(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     """Retrieves a user's expense history (reverse chronological order is best for coach)."""
     return db.query(models.Expense).filter(models.Expense.owner_id == user_id).order_by(models.Expense.date.desc()).offset(skip).limit(limit).all()
@@ -121,7 +516,6 @@ def create_simulator_session(db: Session, session_data: schemas.SimulatorSession
     
     db.add(db_session)
     db.commit()
-    db.refresh(db_session)
     return db_session
 
 def calculate_consecutive_days_logged(db: Session, user_id: int) -> int:
@@ -130,18 +524,18 @@ def calculate_consecutive_days_logged(db: Session, user_id: int) -> int:
     today = date.today()
     streak = 0
     
-    # 1. Define the casted column expression
-    casted_date_column = models.Expense.date.cast(Date).label('expense_date_only')
+    # 1. Truncate to the day in a dialect-safe way (SQLite has no DATE type: CAST yields a number there)
+    day_column = _period_bucket(db, models.Expense.date, "day").label('expense_date_only')
 
-    # 2. Query only the DISTINCT casted column, and ORDER BY the casted column
-    logged_dates_results = db.query(casted_date_column).filter(
+    # 2. Query only the DISTINCT days, newest first
+    logged_dates_results = db.query(day_column).filter(
         models.Expense.owner_id == user_id
     ).distinct(
-    ).order_by(casted_date_column.desc() # FIX: Ordering by the casted value
+    ).order_by(day_column.desc()
     ).all()
     
-    # Extract just the date objects from the result tuples
-    logged_dates = {d[0] for d in logged_dates_results} 
+    # Normalize to date objects (SQLite returns 'YYYY-MM-DD' strings)
+    logged_dates = {_as_date(d[0]) for d in logged_dates_results} 
     
     current_day = today
     
@@ -167,34 +561,26 @@ def count_unique_expense_categories(db: Session, user_id: int) -> int:
     ).distinct().count()
 
 def advance_user_lesson_progress(db: Session, user_id: int):
-    """Increments the user's lesson progress counter."""
-    user = get_user_by_id(db, user_id)
+    """Increments the user's lesson progress counter (one UPDATE ... RETURNING, no read-modify-write)."""
+    user = db.scalars(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(lesson_progress=models.User.lesson_progress + 1)
+        .returning(models.User),
+        execution_options={"populate_existing": True}
+    ).one_or_none()
+    db.commit()
     if user:
-        user.lesson_progress += 1
-        db.commit()
-        db.refresh(user)
+        # The returned row is the fresh user: re-cache it instead of forcing a re-read on the next request
+        USER_CACHE.set(user_id, schemas.User.model_validate(user))
     return user
 
-def create_simulator_session(db: Session, session_data: schemas.SimulatorSession, user_id: int):
-    """Saves the result of a simulation and the AI-generated course content."""
-    data_dict = session_data.model_dump(exclude_unset=True)
-    db_session = models.SimulatorSession(**data_dict, user_id=user_id)
-    
-    db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
-    return db_session
-
 def get_current_mock_price(symbol: str) -> float:
-    """Retrieves a stable mock price for a symbol based on the latest history point."""
-    
-    # Get the mock history data (list of 10 dicts)
-    history = STATIC_ASSET_HISTORY.get(symbol.upper(), [])
-    
-    if history:
-        # Return the latest price point (the last item in the list)
-        return history[-1]['price']
-        
+    """Retrieves the current mock price for a symbol from the market tick engine."""
+    price = market_ticker.price(symbol.upper())
+    if price is not None:
+        return price
+
     # Default to a base price if the symbol is not in the mock store
     return 100.00
 
@@ -212,58 +598,324 @@ def get_user_portfolio_holdings(db: Session, user_id: int) -> List[models.Portfo
         models.Portfolio.shares > 0  # Only return assets currently held
     ).all()
 
-def update_portfolio_shares(db: Session, user_id: int, symbol: str, amount: float, action: str):
-    
-    symbol = symbol.upper()
-    asset = get_asset_in_portfolio(db, user_id, symbol)
-    current_price = get_current_mock_price(symbol)
-    shares_to_trade = amount / current_price
-    
+async def get_user_portfolio_holdings_async(db: AsyncSession, user_id: int) -> List[models.Portfolio]:
+    """Async variant of get_user_portfolio_holdings."""
+    return list(await db.scalars(select(models.Portfolio).where(
+        models.Portfolio.user_id == user_id,
+        models.Portfolio.shares > 0
+    )))
+
+def _holdings_arrays(holdings: List[models.Portfolio]) -> Dict:
+    """Column arrays of the user's holdings for vectorized valuation."""
+    return {
+        "symbols": [h.symbol for h in holdings],
+        "price_index": np.array([SYMBOL_INDEX.get(h.symbol, -1) for h in holdings], dtype=np.intp),
+        "shares": np.array([h.shares for h in holdings], dtype=np.float64),
+        "average_cost": np.array([h.average_cost for h in holdings], dtype=np.float64),
+    }
+
+def _value_holdings(holdings: Dict, prices: np.ndarray) -> Dict:
+    """Values every holding at once against one price tick (symbols outside the store use the 100.00 default)."""
+    index = holdings["price_index"]
+    current_price = np.where(index >= 0, prices[index], 100.00)
+    shares, average_cost = holdings["shares"], holdings["average_cost"]
+    current_value = shares * current_price
+    gain_loss_percent = np.divide(
+        (current_price - average_cost) * 100, average_cost,
+        out=np.zeros_like(average_cost), where=average_cost > 0
+    )
+
+    rows = zip(
+        holdings["symbols"], np.round(shares, 4).tolist(), np.round(current_price, 2).tolist(),
+        np.round(average_cost, 2).tolist(), np.round(current_value, 2).tolist(), np.round(gain_loss_percent, 2).tolist()
+    )
+    return {
+        "total_portfolio_value": round(float(current_value.sum()), 2),
+        "holdings": [
+            {"symbol": s, "shares": sh, "current_price": p, "average_cost": c, "current_value": v, "gain_loss_percent": g}
+            for s, sh, p, c, v, g in rows
+        ]
+    }
+
+def _cache_holdings(user_id: int, holdings: List[models.Portfolio]) -> Dict:
+    entry = {"holdings": _holdings_arrays(holdings), "tick": None, "valuation": None}
+    PORTFOLIO_CACHE.set(user_id, entry)
+    return entry
+
+def _valuation_for_tick(entry: Dict, tick: int, prices: np.ndarray) -> Dict:
+    if entry["tick"] != tick:
+        # Same holdings, new tick: revalue in place. The entry keeps its original expiry, so the TTL still bounds staleness
+        entry["valuation"] = {**_value_holdings(entry["holdings"], prices), "price_tick": tick}
+        entry["tick"] = tick
+    return entry["valuation"]
+
+def get_portfolio_valuation(db: Session, user_id: int) -> Dict:
+    """
+    The user's portfolio valued at the current price tick, as {'total_portfolio_value', 'holdings', 'price_tick'}.
+    Repeated calls within a tick are a cache lookup; a new tick revalues the cached holdings without
+    touching the database; only a trade (or the TTL) sends it back to the DB.
+    NOTE: the returned dict is shared between callers, don't mutate it.
+    """
+    tick, prices = market_ticker.quote()
+    entry = PORTFOLIO_CACHE.get(user_id)
+    if entry is None:
+        entry = _cache_holdings(user_id, get_user_portfolio_holdings(db, user_id))
+    return _valuation_for_tick(entry, tick, prices)
+
+async def get_portfolio_valuation_async(db: AsyncSession, user_id: int) -> Dict:
+    """Async variant of get_portfolio_valuation (same PORTFOLIO_CACHE)."""
+    tick, prices = market_ticker.quote()
+    entry = PORTFOLIO_CACHE.get(user_id)
+    if entry is None:
+        entry = _cache_holdings(user_id, await get_user_portfolio_holdings_async(db, user_id))
+    return _valuation_for_tick(entry, tick, prices)
+
+def invalidate_cached_portfolio(user_id: int):
+    """Drops the cached holdings/valuation so the next read re-queries the user's positions."""
+    PORTFOLIO_CACHE.invalidate(user_id)
+
+DUST_SHARES = 0.0001 # A sale leaving less than this closes the position out to 0
+
+def _position_upsert(db: Session):
+    """Dialect insert() with ON CONFLICT support, or None when the backend has none."""
+    dialect = db.get_bind().dialect.name
+    return postgresql_insert if dialect == "postgresql" else sqlite_insert if dialect == "sqlite" else None
+
+def _apply_fill_locked(db: Session, user_id: int, symbol: str, shares: float, price: float, action: str) -> Optional[models.Portfolio]:
+    """Fallback for dialects without ON CONFLICT: read-modify-write under a row lock. None = not enough shares."""
+    asset = db.query(models.Portfolio).filter(
+        models.Portfolio.user_id == user_id,
+        models.Portfolio.symbol == symbol
+    ).with_for_update().first()
+
     if action == "Buy":
         if not asset:
-            # 1. NEW ASSET: Create the object and add it to the session
-            asset = models.Portfolio(
-                user_id=user_id, symbol=symbol, shares=shares_to_trade, average_cost=current_price
-            )
+            asset = models.Portfolio(user_id=user_id, symbol=symbol, shares=shares, average_cost=price)
             db.add(asset)
         else:
-            # 2. EXISTING ASSET: Update existing object properties
-            new_total_cost = (asset.shares * asset.average_cost) + amount
-            new_total_shares = asset.shares + shares_to_trade
-            asset.average_cost = new_total_cost / new_total_shares
-            asset.shares = new_total_shares
-            
-    elif action == "Sell":
-        if not asset:
-             # FIX 1: If asset doesn't exist to sell, raise the HTTP Exception immediately.
-             # This prevents the db.refresh(None) error.
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You do not hold any shares of this asset.")
-        
-        if asset.shares < shares_to_trade:
-             # FIX 2: If asset exists but shares are insufficient, raise HTTP Exception.
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot sell more shares than currently held.")
-        
-        # Update shares for successful sale
-        asset.shares -= shares_to_trade
-        if asset.shares < 0.0001: 
-            asset.shares = 0.0
-            
+            asset.average_cost = (asset.shares * asset.average_cost + shares * price) / (asset.shares + shares)
+            asset.shares += shares
+    else:
+        if not asset or asset.shares < shares:
+            return None
+        asset.shares = 0.0 if asset.shares - shares < DUST_SHARES else asset.shares - shares
+    db.flush()
+    return asset
+
+def _apply_fill(db: Session, user_id: int, symbol: str, shares: float, price: float, action: str) -> Optional[models.Portfolio]:
+    """
+    Applies one fill to the position in a single atomic statement (no read-modify-write race):
+    - Buy: INSERT ... ON CONFLICT (user_id, symbol) DO UPDATE with the weighted average cost
+    - Sell: UPDATE ... WHERE shares >= :shares, so concurrent sells can never oversell
+    Returns the updated position, or None if a sale was rejected. Does NOT commit.
+    """
+    upsert = _position_upsert(db)
+    if upsert is None:
+        return _apply_fill_locked(db, user_id, symbol, shares, price, action)
+
+    portfolio = models.Portfolio
+    if action == "Buy":
+        stmt = upsert(portfolio).values(user_id=user_id, symbol=symbol, shares=shares, average_cost=price)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[portfolio.user_id, portfolio.symbol],
+            # Both SET expressions read the row as it was before this update
+            set_={
+                "average_cost": (portfolio.shares * portfolio.average_cost + stmt.excluded.shares * stmt.excluded.average_cost)
+                                / (portfolio.shares + stmt.excluded.shares),
+                "shares": portfolio.shares + stmt.excluded.shares,
+            }
+        )
     else:
-        # If the action is neither Buy nor Sell
+        remaining = portfolio.shares - shares
+        stmt = update(portfolio).where(
+            portfolio.user_id == user_id,
+            portfolio.symbol == symbol,
+            portfolio.shares >= shares
+        ).values(shares=case((remaining < DUST_SHARES, 0.0), else_=remaining))
+
+    return db.scalars(
+        stmt.returning(portfolio),
+        execution_options={"populate_existing": True}
+    ).one_or_none()
+
+def update_portfolio_shares(db: Session, user_id: int, symbol: str, amount: float, action: str):
+    """
+    Executes a paper trade at the current mock price: updates the position atomically and
+    appends the fill to the trades ledger, in one transaction.
+    """
+    symbol = symbol.upper()
+    if action not in ("Buy", "Sell"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid action type: {action}")
+    if amount <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Trade amount must be positive.")
+
+    current_price = get_current_mock_price(symbol)
+    shares_to_trade = amount / current_price
+
+    if action == "Sell":
+        # A missing or emptied (0-share) position gets its own error; the conditional UPDATE below
+        # then only rejects a sale that is too large (or lost a race with a concurrent sell)
+        held = get_asset_in_portfolio(db, user_id, symbol)
+        if not held or held.shares <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You do not hold any shares of this asset.")
 
-    # CRITICAL PERSISTENCE BLOCK: Commit the transaction
     try:
-        db.commit() 
+        asset = _apply_fill(db, user_id, symbol, shares_to_trade, current_price, action)
+        if asset is None:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot sell more shares than currently held.")
+
+        db.add(models.Trade(
+            user_id=user_id, symbol=symbol, action=action,
+            shares=shares_to_trade, price=current_price, amount=amount
+        ))
+        # CRITICAL PERSISTENCE BLOCK: position and ledger entry commit together
+        db.commit()
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Transaction failed during commit: {e}")
 
-    # After a successful commit, the asset is persistent. Refresh and return it.
-    db.refresh(asset) 
-    
+    invalidate_cached_portfolio(user_id)
     return asset
 
+async def update_portfolio_shares_async(db: AsyncSession, user_id: int, symbol: str, amount: float, action: str):
+    """Async variant of update_portfolio_shares (the same atomic statements, run through run_sync)."""
+    return await db.run_sync(update_portfolio_shares, user_id, symbol, amount, action)
+
+def _quote_prices(symbols) -> Dict[str, float]:
+    """Current prices for several symbols, all from the same market tick (100.00 for unknown symbols)."""
+    _, prices = market_ticker.quote()
+    return {s: float(prices[SYMBOL_INDEX[s]]) if s in SYMBOL_INDEX else 100.00 for s in symbols}
+
+def execute_trade_batch(db: Session, user_id: int, orders: List[Dict]) -> List[Dict]:
+    """
+    Applies a basket of orders in ONE transaction: every order fills or none do. Commits.
+    Orders are priced at the same tick and validated, in order, against holdings loaded with a
+    single query (so a sell may use shares bought earlier in the same basket).
+    Returns the fills as [{'symbol', 'action', 'shares', 'price', 'amount'}].
+    """
+    symbols = {order["symbol"].upper() for order in orders}
+    prices = _quote_prices(symbols)
+    held = {
+        p.symbol: p.shares
+        for p in db.query(models.Portfolio).filter(
+            models.Portfolio.user_id == user_id,
+            models.Portfolio.symbol.in_(symbols)
+        )
+    }
+
+    fills = []
+    for number, order in enumerate(orders, start=1):
+        symbol, action, amount = order["symbol"].upper(), order["action"], order["amount"]
+        if action not in ("Buy", "Sell"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Order {number}: Invalid action type: {action}")
+        if amount <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Order {number}: Trade amount must be positive.")
+
+        shares = amount / prices[symbol]
+        if action == "Sell":
+            if not held.get(symbol):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Order {number}: You do not hold any shares of {symbol}.")
+            if held[symbol] < shares:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Order {number}: Cannot sell more {symbol} shares than currently held.")
+            held[symbol] = 0.0 if held[symbol] - shares < DUST_SHARES else held[symbol] - shares
+        else:
+            held[symbol] = held.get(symbol, 0.0) + shares
+        fills.append({"symbol": symbol, "action": action, "shares": shares, "price": prices[symbol], "amount": amount})
+
+    try:
+        for fill in fills:
+            if _apply_fill(db, user_id, fill["symbol"], fill["shares"], fill["price"], fill["action"]) is None:
+                # Another request sold these shares after validation: the whole basket is undone
+                db.rollback()
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Holdings changed while the basket was executing; nothing was traded.")
+        db.execute(insert(models.Trade), [{"user_id": user_id, **fill} for fill in fills])
+        db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Basket failed, nothing was traded: {e}")
+
+    invalidate_cached_portfolio(user_id)
+    return fills
+
+def replay_trades(trades: List[models.Trade]) -> Dict[tuple, tuple]:
+    """Replays fills (in id order) with the same arithmetic as _apply_fill: {(user_id, symbol): (shares, average_cost)}."""
+    positions: Dict[tuple, tuple] = {}
+    for trade in trades:
+        key = (trade.user_id, trade.symbol)
+        shares, average_cost = positions.get(key, (0.0, 0.0))
+        if trade.action == "Buy":
+            average_cost = (shares * average_cost + trade.shares * trade.price) / (shares + trade.shares)
+            shares += trade.shares
+        else:
+            shares = 0.0 if shares - trade.shares < DUST_SHARES else shares - trade.shares
+        positions[key] = (shares, average_cost)
+    return positions
+
+def _ledger_positions(db: Session, user_id: Optional[int] = None) -> Dict[tuple, tuple]:
+    query = db.query(models.Trade)
+    if user_id is not None:
+        query = query.filter(models.Trade.user_id == user_id)
+    return replay_trades(query.order_by(models.Trade.id).all())
+
+def find_ledger_mismatches(db: Session, user_id: Optional[int] = None, tolerance: float = 1e-6) -> List[Dict]:
+    """Positions that disagree with a replay of the ledger (empty list = consistent)."""
+    expected = _ledger_positions(db, user_id)
+    query = db.query(models.Portfolio)
+    if user_id is not None:
+        query = query.filter(models.Portfolio.user_id == user_id)
+    actual = {(p.user_id, p.symbol): (p.shares, p.average_cost) for p in query.all()}
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        want, have = expected.get(key, (0.0, 0.0)), actual.get(key, (0.0, 0.0))
+        if abs(want[0] - have[0]) > tolerance or abs(want[1] - have[1]) > tolerance * max(1.0, abs(want[1])):
+            mismatches.append({"user_id": key[0], "symbol": key[1], "ledger": want, "position": have})
+    return mismatches
+
+def rebuild_positions_from_ledger(db: Session, user_id: Optional[int] = None):
+    """
+    Replaces portfolio rows (all users, or one) with a replay of the trades ledger. Commits.
+    NOTE: positions opened before the ledger existed must be seeded first (seed_ledger_from_positions),
+    otherwise they are dropped.
+    """
+    positions = _ledger_positions(db, user_id)
+    delete_query = db.query(models.Portfolio)
+    if user_id is not None:
+        delete_query = delete_query.filter(models.Portfolio.user_id == user_id)
+    delete_query.delete(synchronize_session=False)
+
+    rows = [
+        {"user_id": uid, "symbol": symbol, "shares": shares, "average_cost": average_cost}
+        for (uid, symbol), (shares, average_cost) in positions.items()
+    ]
+    if rows:
+        db.execute(insert(models.Portfolio), rows)
+    db.commit()
+    for uid in {row["user_id"] for row in rows} | ({user_id} if user_id is not None else set()):
+        invalidate_cached_portfolio(uid)
+
+def seed_ledger_from_positions(db: Session) -> int:
+    """One-off migration: records an opening Buy at average cost for every position with no ledger history. Commits."""
+    has_trades = select(models.Trade.id).where(
+        models.Trade.user_id == models.Portfolio.user_id,
+        models.Trade.symbol == models.Portfolio.symbol
+    ).exists()
+    untracked = db.query(models.Portfolio).filter(models.Portfolio.shares > 0, ~has_trades).all()
+    db.add_all([
+        models.Trade(
+            user_id=p.user_id, symbol=p.symbol, action="Buy",
+            shares=p.shares, price=p.average_cost, amount=p.shares * p.average_cost
+        )
+        for p in untracked
+    ])
+    db.commit()
+    return len(untracked)
+
 def create_income(db: Session, income: schemas.IncomeCreate, user_id: int):
     """Logs a new income entry linked to a user."""
     
@@ -284,11 +936,60 @@ def create_income(db: Session, income: schemas.IncomeCreate, user_id: int):
     
     db.add(db_income)
     db.commit()
-    db.refresh(db_income)
     return db_income
 
 def get_user_incomes(db: Session, user_id: int, limit: int = 50):
     """Retrieves a user's income history for analysis."""
     return db.query(models.Income).filter(
         models.Income.owner_id == user_id
-    ).order_by(models.Income.date.desc()).limit(limit).all()
\ No newline at end of file
+    ).order_by(models.Income.date.desc()).limit(limit).all()
+
+# --- CHAT SESSION CRUD ---
+
+def load_chat_context(db: Session, user_id: int, session_id: Optional[int] = None, new_session: bool = False):
+    """
+    Returns (session, unsummarized_turns) for the user's chat. Without a session_id the user's
+    latest session is resumed (one is created if they have none, or if new_session is set), so
+    clients that don't track the id still get their history and summary instead of a fresh row
+    per message. Only turns not yet folded into the summary are loaded, so this stays bounded no
+    matter how long the conversation gets.
+    """
+    if session_id is None:
+        chat_session = None if new_session else db.query(models.ChatSession).filter(
+            models.ChatSession.user_id == user_id
+        ).order_by(models.ChatSession.id.desc()).first()
+        if chat_session is None:
+            chat_session = models.ChatSession(user_id=user_id, summary="", summarized_through_id=0)
+            db.add(chat_session)
+            db.commit()
+            return chat_session, []
+    else:
+        chat_session = db.query(models.ChatSession).filter(
+            models.ChatSession.id == session_id,
+            models.ChatSession.user_id == user_id
+        ).first()
+        if not chat_session:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+
+    turns = db.query(models.ChatTurn).filter(
+        models.ChatTurn.session_id == chat_session.id,
+        models.ChatTurn.id > chat_session.summarized_through_id
+    ).order_by(models.ChatTurn.id.asc()).all()
+    return chat_session, turns
+
+def add_chat_exchange(db: Session, session_id: int, user_message: str, reply: str):
+    """Persists one user message and the coach's reply."""
+    db.add_all([
+        models.ChatTurn(session_id=session_id, role="user", message=user_message),
+        models.ChatTurn(session_id=session_id, role="model", message=reply)
+    ])
+    db.commit()
+
+def update_chat_summary(db: Session, session_id: int, summary: str, summarized_through_id: int):
+    """Stores the rolled-up summary and marks turns up to summarized_through_id as folded in."""
+    db.query(models.ChatSession).filter(models.ChatSession.id == session_id).update({
+        models.ChatSession.summary: summary,
+        models.ChatSession.summarized_through_id: summarized_through_id,
+        models.ChatSession.updated_at: datetime.utcnow()
+    })
+    db.commit()
@@ -1,19 +1,30 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
-from .models import Base 
+from .models import Base
+from .pool import engine_options
 
 load_dotenv()
-SUPABASE_DATABASE_URL = os.getenv("SUPABASE_DATABASE_URL")
+# DATABASE_URL is the explicit opt-in for anything other than Supabase (e.g. sqlite:///./app.db
+# for local runs). With neither set, refuse to start rather than quietly run on an empty local file.
+SUPABASE_DATABASE_URL = os.getenv("SUPABASE_DATABASE_URL") or os.getenv("DATABASE_URL")
+if not SUPABASE_DATABASE_URL:
+    raise RuntimeError("No database configured: set SUPABASE_DATABASE_URL (or DATABASE_URL, e.g. sqlite:///./app.db for local runs).")
 
-engine = create_engine(
-    SUPABASE_DATABASE_URL,
-    pool_pre_ping = True,
-    pool_recycle = 3600
-)
+_sync_url, _sync_options = engine_options(SUPABASE_DATABASE_URL)
+engine = create_engine(_sync_url, **_sync_options)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False (like the async session): writers return what they just flushed (ids from
+# RETURNING, Python-side defaults) instead of paying a SELECT per object to reload it after commit
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+_async_url, _async_options = engine_options(SUPABASE_DATABASE_URL, is_async=True)
+async_engine = create_async_engine(_async_url, **_async_options)
+
+# expire_on_commit=False: after commit, attribute access must not trigger (implicit, unsupported) async IO
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 def get_db():
     db = SessionLocal()
@@ -22,7 +33,11 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def create_db_and_tables():
     print("Attempting to create database tables in Supabase...")
     Base.metadata.create_all(bind=engine)
-    print("Tables created/verified.")
\ No newline at end of file
+    print("Tables created/verified.")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -30,6 +30,11 @@ class User(Base):
     experience_level = Column(String, nullable=True) 
     achievements = Column(Text, default="[]") 
 
+    # --- LOGGING STREAK (maintained incrementally by crud.create_expense) ---
+    current_streak = Column(Integer, nullable=False, default=0) # Consecutive days ending at last_logged_date
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_logged_date = Column(Date, nullable=True) # Latest day with at least one expense
+
     expenses = relationship("Expense", back_populates="owner")
     
     goals = relationship("Goal", back_populates="user")
@@ -40,9 +45,18 @@ class User(Base):
 
     incomes = relationship("Income", back_populates="owner")
 
+    chat_sessions = relationship("ChatSession", back_populates="user")
+
+    trades = relationship("Trade", back_populates="user")
+
 
 class Expense(Base):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        # Hot path: per-user history ordered by date (streak, history, rollups)
+        Index('ix_expenses_owner_id_date', 'owner_id', 'date'),
+        Index('ix_expenses_owner_id_category', 'owner_id', 'category'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float, nullable=False)
@@ -54,6 +68,17 @@ class Expense(Base):
     owner = relationship("User", back_populates="expenses")
 
 
+class ExpenseMonthlyRollup(Base):
+    """Per-user, per-month, per-category expense totals, maintained on insert so summaries never scan expenses."""
+    __tablename__ = 'expense_monthly_rollup'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    month = Column(Date, primary_key=True) # First day of the month
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+
 class Goal(Base):
     __tablename__ = 'goals'
 
@@ -62,7 +87,7 @@ class Goal(Base):
     target_amount = Column(Float, nullable=False)
     current_amount = Column(Float, default=0.0)
     
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     user = relationship("User", back_populates="goals")
 
 class SimulatorSession(Base):
@@ -76,12 +101,16 @@ class SimulatorSession(Base):
     course_summary = Column(Text, nullable=False) 
     projected_value = Column(Float, nullable=False)
 
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     user = relationship("User", back_populates="simulator_sessions")
 
 class Portfolio(Base):
     """NEW MODEL: Tracks the user's paper trading assets and simulated cash."""
     __tablename__ = 'portfolios'
+    __table_args__ = (
+        # One row per (user, symbol): get_asset_in_portfolio is a single unique index probe
+        Index('uq_portfolios_user_id_symbol', 'user_id', 'symbol', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, nullable=False) # e.g., 'MSFT', 'GOOG'
@@ -95,6 +124,9 @@ class Portfolio(Base):
 class Income(Base):
     """NEW MODEL: Stores manually logged income events."""
     __tablename__ = 'incomes'
+    __table_args__ = (
+        Index('ix_incomes_owner_id_date', 'owner_id', 'date'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float, nullable=False)
@@ -102,4 +134,50 @@ class Income(Base):
     date = Column(DateTime, default=datetime.utcnow) # Accepts user-provided date
     
     owner_id = Column(Integer, ForeignKey('users.id'))
-    owner = relationship("User", back_populates="incomes")
\ No newline at end of file
+    owner = relationship("User", back_populates="incomes")
+
+class ChatSession(Base):
+    """Server-side coach conversation. Older turns are rolled into `summary` so prompts stay bounded."""
+    __tablename__ = 'chat_sessions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    summary = Column(Text, nullable=False, default="")
+    # Highest chat_turns.id already folded into `summary` (0 = nothing summarized yet)
+    summarized_through_id = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    user = relationship("User", back_populates="chat_sessions")
+    turns = relationship("ChatTurn", back_populates="session")
+
+class ChatTurn(Base):
+    """A single chat message in a session ('user' or 'model')."""
+    __tablename__ = 'chat_turns'
+
+    id = Column(Integer, primary_key=True, index=True)
+    role = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    session_id = Column(Integer, ForeignKey('chat_sessions.id'), index=True)
+    session = relationship("ChatSession", back_populates="turns")
+
+class Trade(Base):
+    """Append-only ledger of paper-trade fills. Portfolio rows can always be rebuilt by replaying it."""
+    __tablename__ = 'trades'
+    __table_args__ = (
+        # Replay order for one position (crud.rebuild_positions_from_ledger)
+        Index('ix_trades_user_id_symbol_id', 'user_id', 'symbol', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    action = Column(String, nullable=False) # 'Buy' or 'Sell'
+    shares = Column(Float, nullable=False) # Always positive; the action gives the direction
+    price = Column(Float, nullable=False) # Fill price per share
+    amount = Column(Float, nullable=False) # Cash value of the fill (shares * price)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user = relationship("User", back_populates="trades")
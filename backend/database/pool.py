@@ -0,0 +1,120 @@
+# database/pool.py (Connection pool settings from the environment, plus checkout instrumentation)
+
+import os
+import threading
+import time
+from typing import Dict, Tuple
+from uuid import uuid4
+from dotenv import load_dotenv
+from sqlalchemy import exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from utils.metrics import get_latency_recorder
+
+load_dotenv()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30)) # Seconds a checkout waits before failing
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Supabase's transaction pooler (PgBouncer, port 6543) may run each transaction on a different
+# server connection, so server-side prepared statements can't be reused. This turns off the
+# caches that create them.
+DB_TRANSACTION_POOLER = os.getenv("DB_TRANSACTION_POOLER", "false").lower() in ("1", "true", "yes")
+
+# Async drivers for the same database (used by the async routes; scripts keep the sync engine)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+class PoolCheckoutStats:
+    """Checkout counters and wait-time percentiles for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.wait = get_latency_recorder(f"db_pool.{name}.checkout_wait")
+        self.checkouts = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, waited: float, timed_out: bool = False):
+        self.wait.observe(waited)
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def snapshot(self) -> Dict:
+        return {"checkouts": self.checkouts, "timeouts": self.timeouts, "checkout_wait": self.wait.snapshot()}
+
+class _CheckoutTimingMixin:
+    """Times every checkout, including the wait for a free connection when the pool is exhausted."""
+    stats: PoolCheckoutStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    stats = PoolCheckoutStats("sync")
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    stats = PoolCheckoutStats("async")
+
+def engine_options(url: str, is_async: bool = False) -> Tuple[URL, Dict]:
+    """(url, create_engine kwargs) for the sync engine or, with is_async, its async counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    connect_args: Dict = {}
+
+    if is_async:
+        if backend == "postgresql" and "sslmode" in url.query:
+            # asyncpg takes `ssl` instead of libpq's `sslmode`
+            connect_args["ssl"] = url.query["sslmode"]
+            url = url.difference_update_query(["sslmode"])
+        url = url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+
+    options: Dict = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single connection: keep SQLAlchemy's default pool for it
+        return url, options
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    if DB_TRANSACTION_POOLER and backend == "postgresql" and is_async:
+        # psycopg2 (sync engine) never prepares server-side, so only asyncpg needs this
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+        connect_args.update(
+            statement_cache_size=0,
+            # Unique names, so a statement prepared on one server connection can't collide on another
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+    if connect_args:
+        options["connect_args"] = connect_args
+    return url, options
+
+def pool_status(engine) -> Dict:
+    """Live pool occupancy plus checkout stats, for /debug/pool."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    status = {"pool": type(pool).__name__, "transaction_pooler": DB_TRANSACTION_POOLER}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            max_overflow=DB_MAX_OVERFLOW,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0), # Connections open beyond pool_size right now
+            timeout_s=pool.timeout(),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
@@ -1,14 +1,16 @@
 # database/schemas.py
 
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import Optional, List, Dict, Literal
 from datetime import datetime, date
+import datetime as dt
 
 # --- Schemas for Authentication & Tokens (Response) ---
 
 class TokenData(BaseModel):
     """Schema for data stored inside the JWT."""
     email: Optional[str] = None
+    user_id: Optional[int] = None # 'uid' claim; tokens issued before it was added only carry 'sub'
 
 class Token(BaseModel):
     """Schema for the returned JWT Access Token."""
@@ -44,14 +46,39 @@ class ExpenseCreate(BaseModel):
     amount: float
     category: str
     note: Optional[str] = None
-    date: Optional[date] = None
+    # NOTE: dt.date, not date: a field named `date` shadows the type inside the class body
+    date: Optional[dt.date] = None
 
 class SimulatorInput(BaseModel):
     """Schema for the Investment Simulator input from the frontend."""
     start: float
     monthly: float
-    years: int
+    years: int = Field(ge=1, le=100) # Upper bound caps the Monte Carlo arrays (paths x years * 12)
     risk: str # 'Low', 'Medium', or 'High'
+    # 'deterministic' (closed-form only) or 'monte_carlo' (adds P10/P50/P90 bands per year)
+    mode: str = Field("deterministic", pattern="^(deterministic|monte_carlo)$")
+    paths: int = Field(10_000, ge=1_000, le=100_000) # Monte Carlo paths
+    seed: Optional[int] = Field(None, ge=0) # Monte Carlo seed; omit for a random (echoed back) one
+
+
+class SimulatorRange(BaseModel):
+    """An inclusive slider range: min, min + step, ..., max."""
+    min: float = Field(ge=0)
+    max: float = Field(ge=0)
+    step: float = Field(gt=0)
+
+class SimulatorGridInput(BaseModel):
+    """Schema for POST /simulate/grid: every combination of the ranges is evaluated."""
+    start: SimulatorRange
+    monthly: SimulatorRange
+    years: SimulatorRange
+    risks: List[Literal["Low", "Medium", "High"]] = Field(["Low", "Medium", "High"], min_length=1)
+
+    @field_validator("risks")
+    @classmethod
+    def dedupe_risks(cls, risks: List[str]) -> List[str]:
+        # Repeats would only add identical rows (and count toward the grid's cell cap)
+        return list(dict.fromkeys(risks))
 
     
 # --- Schemas for Data Going OUT (Response Bodies) ---
@@ -115,6 +142,8 @@ class SimulatorSession(BaseModel):
 
 class ChatMessage(BaseModel):
     message : str
+    session_id: Optional[int] = None # Omit to continue the user's latest server-side chat session
+    new_session: bool = False # With no session_id: start a fresh session instead of resuming
 
 class InvestmentAction(BaseModel):
     """Schema for a user's buy/sell request in the simulator."""
@@ -123,6 +152,23 @@ class InvestmentAction(BaseModel):
     action: str # 'Buy' or 'Sell'
     amount: float
 
+class InvestmentBatch(BaseModel):
+    """A basket of buy/sell orders, applied all-or-nothing in order."""
+    orders: List[InvestmentAction] = Field(..., min_length=1, max_length=50)
+
+class TradeFill(BaseModel):
+    symbol: str
+    action: str
+    shares: float
+    price: float
+    amount: float
+
+class InvestmentBatchResult(BaseModel):
+    status: str
+    message: str
+    advice_nudge: str
+    fills: List[TradeFill]
+
 class LessonContent(BaseModel):
     lesson_title: str
     lesson_content: str
@@ -135,7 +181,7 @@ class IncomeCreate(BaseModel):
     amount: float
     source: str
     # Allows date input similar to ExpenseCreate
-    date: Optional[date] = None 
+    date: Optional[dt.date] = None 
 
 class Income(IncomeCreate):
     """Schema for returning an income entry."""
@@ -144,4 +190,76 @@ class Income(IncomeCreate):
     owner_id: int
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BulkImportError(BaseModel):
+    """A rejected row in a bulk import (1-based data row number, header excluded)."""
+    row: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    """Outcome of POST /expenses/bulk or /incomes/bulk."""
+    inserted: int
+    failed: int
+    errors: List[BulkImportError] # Capped at BULK_IMPORT_MAX_ERRORS; `failed` counts all of them
+
+
+class ExpenseListItem(BaseModel):
+    """Lean expense row for history views."""
+    id: int
+    amount: float
+    category: str
+    note: Optional[str] = None
+    date: datetime
+
+    class Config:
+        from_attributes = True
+
+class ExpensePage(BaseModel):
+    items: List[ExpenseListItem]
+    next_cursor: Optional[str] = None # Pass back as ?cursor= for the next page; None on the last page
+
+class IncomeListItem(BaseModel):
+    """Lean income row for history views."""
+    id: int
+    amount: float
+    source: str
+    date: datetime
+
+    class Config:
+        from_attributes = True
+
+class IncomePage(BaseModel):
+    items: List[IncomeListItem]
+    next_cursor: Optional[str] = None
+
+
+class CategoryTotal(BaseModel):
+    category: str
+    total: float
+    count: int
+
+class PeriodTotal(BaseModel):
+    period_start: date
+    total: float
+    count: int
+    categories: Dict[str, float] # category -> total within this period
+
+class SpendingSummary(BaseModel):
+    """Aggregated spending for GET /expenses/summary."""
+    period: str # 'day', 'week' or 'month'
+    start_date: date
+    end_date: date
+    total: float
+    by_category: List[CategoryTotal]
+    by_period: List[PeriodTotal]
+
+
+class SimulatorGrid(BaseModel):
+    """
+    Projected final values for the whole grid, flattened row-major over `shape`
+    (axis order: risk, start, monthly, years). Index = ((r * S + s) * M + m) * Y + y.
+    """
+    axes: Dict[str, List]
+    shape: List[int]
+    projected_final_value: List[int]
@@ -1,21 +1,44 @@
 # main.py
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, Request, Query, WebSocket
 from sqlalchemy.orm import Session
-from datetime import timedelta, datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta, datetime, date
 from dotenv import load_dotenv
 import os
-from typing import Dict
+from typing import Dict, List, Optional
+import json
+import numpy as np
 import random
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
 # Database, Security, and Schema Imports
-from database.database import create_db_and_tables, get_db
+from database.database import create_db_and_tables, get_db, get_async_db, SessionLocal, engine, async_engine
+from database.pool import pool_status
 from database import crud, schemas
-from auth.auth_service import create_access_token, verify_password, get_current_user_email
+from auth.auth_service import create_access_token, get_current_user_email, get_current_token_data
+from auth.auth_service import oauth2_scheme, revoke_token, get_password_hash_async, verify_and_update_password_async
 from auth.auth_service import ACCESS_TOKEN_EXPIRE_MINUTES
+from auth.dependencies import get_current_user, get_current_user_async
 from ai.coach_agent import generate_investment_micro_course, run_mock_simulation, generate_financial_summary, get_chat_response, execute_investment_simulation, get_mock_asset_history, generate_next_lesson
+from ai.coach_agent import generate_investment_micro_course_async, get_chat_response_async, execute_investment_simulation_async, generate_next_lesson_async
+from ai.coach_agent import stream_chat_response_async, nudge_pool
+from ai.chat_memory import build_chat_window, roll_chat_summary
+from ai.monte_carlo import run_monte_carlo
+from ai.coach_agent import run_mock_simulation_grid
+from ai.market_ticker import market_ticker
+from utils.metrics import get_latency_recorder, latency_snapshot
+from utils.bulk_import import detect_format, run_bulk_import
+from utils.pagination import encode_cursor, decode_cursor
+from utils.sql_timing import SQLTimingMiddleware, instrument_engine
+from utils.prometheus import PrometheusMiddleware, metrics_payload
 
 origins = [
     "http://localhost:3000",       # Local Frontend Development URL
@@ -26,7 +49,14 @@ origins = [
 ]
 # --- APP INITIALIZATION ---
 load_dotenv()
-app = FastAPI(title="Finity: The Frugal Friend Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    market_ticker.start() # Pushes price ticks to /market/ws subscribers
+    yield
+    await market_ticker.stop()
+
+app = FastAPI(title="Finity: The Frugal Friend Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +66,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request SQL count / DB time as Server-Timing headers; slow requests and N+1 suspects are logged
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+app.add_middleware(SQLTimingMiddleware)
+# Outermost, so its latency covers the other middleware too
+app.add_middleware(PrometheusMiddleware)
+
+# Chat latency recorders (blocking vs. streaming), summarized at /debug/latency
+CHAT_TOTAL = get_latency_recorder("chat.total")
+CHAT_STREAM_TTFT = get_latency_recorder("chat_stream.time_to_first_token")
+CHAT_STREAM_TOTAL = get_latency_recorder("chat_stream.total")
+
 # NOTE: Tables must be created. Assuming this was done successfully with the Supabase connection.
 # create_db_and_tables() 
 
@@ -49,21 +91,38 @@ def root():
         "message": "Finity Backend API - CORS Fixed v2"
     }
 
+@app.get("/debug/latency", tags=["Debug"])
+def debug_latency():
+    """p50/p95/p99 of the in-process latency recorders (per worker)."""
+    return latency_snapshot()
+
+@app.get("/debug/pool", tags=["Debug"])
+def debug_pool():
+    """Connection pool occupancy, overflow and checkout wait for both engines (per worker)."""
+    return {"sync": pool_status(engine), "async": pool_status(async_engine)}
+
+@app.get("/metrics", tags=["Debug"], include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (route latency histograms, in-flight gauges, LLM call metrics)."""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
 # --- 1. AUTHENTICATION ROUTES (Amogh & Muneer's Focus) ---
 
 @app.post("/signup", response_model=schemas.Token, tags=["Auth"])
-def signup(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    """User registration: hashes password and returns a JWT."""
-    db_user = crud.get_user_by_email(db, email=user_data.email)
+async def signup(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+    """User registration: hashes password (in the hashing pool) and returns a JWT."""
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user_data.email)
     if db_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     
-    db_user = crud.create_user(db=db, user=user_data)
+    hashed_password = await get_password_hash_async(user_data.password)
+    db_user = await run_in_threadpool(crud.create_user, db=db, user=user_data, hashed_password=hashed_password)
     
     # Create the JWT token for immediate login
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": db_user.email, "uid": db_user.id}, expires_delta=access_token_expires
     )
     
     return {
@@ -74,20 +133,27 @@ def signup(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
     }
 
 @app.post("/login", response_model=schemas.Token, tags=["Auth"])
-def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    """User login: verifies credentials and returns a JWT."""
-    db_user = crud.get_user_by_email(db, email=form_data.email)
+async def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
+    """User login: verifies credentials (in the hashing pool) and returns a JWT."""
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=form_data.email)
+    valid, new_hash = False, None
+    if db_user:
+        valid, new_hash = await verify_and_update_password_async(form_data.password, db_user.hashed_password)
     
-    if not db_user or not verify_password(form_data.password, db_user.hashed_password):
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if new_hash:
+        # The work factor changed since this password was hashed: upgrade it transparently
+        await run_in_threadpool(crud.update_password_hash, db, db_user.id, new_hash)
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": db_user.email, "uid": db_user.id}, expires_delta=access_token_expires
     )
     
     return {
@@ -97,16 +163,15 @@ def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
         "user_email": db_user.email 
     }
 
+@app.post("/logout", status_code=status.HTTP_204_NO_CONTENT, tags=["Auth"])
+def logout(token: str = Depends(oauth2_scheme)):
+    """Revokes the bearer token, so it stops working before its natural expiry."""
+    revoke_token(token)
+
 @app.get("/users/me", response_model=schemas.User, tags=["Users"])
-def read_users_me(
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user_email)
-):
+async def read_users_me(current_user: schemas.User = Depends(get_current_user_async)):
     """Protected route to verify the current user's token and return their data."""
-    db_user = crud.get_user_by_email(db, email=current_user_email)
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return db_user
+    return current_user
 
 # --- 2. ONBOARDING & DATA ROUTES (Mallika Focus) ---
 
@@ -114,90 +179,144 @@ def read_users_me(
 def onboard_user(
     data: schemas.OnboardingData,
     db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user_email)
+    user: schemas.User = Depends(get_current_user)
 ):
     """Saves initial budget/goal data from onboarding."""
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-        
     updated_user = crud.update_onboarding_data(db, user_id=user.id, data=data)
     return updated_user
 
 @app.post("/expenses", response_model=schemas.Expense, tags=["Data"])
-def create_expense(
+async def create_expense(
     expense: schemas.ExpenseCreate,
-    db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user_email)
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async)
 ):
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-    
     # MODIFICATION: Pass the expense object directly (Pydantic handles the Optional field)
-    return crud.create_expense(db=db, expense=expense, user_id=user.id)
+    return await crud.create_expense_async(db=db, expense=expense, user_id=user.id)
+
+HISTORY_PAGE_MAX = 200
+
+@app.get("/expenses", response_model=schemas.ExpensePage, tags=["Data"])
+def list_expenses(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_MAX),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """Expense history, newest first, with cursor pagination (constant cost at any depth)."""
+    rows, has_more = crud.get_user_expenses_page(
+        db, user.id, limit=limit, after=decode_cursor(cursor),
+        start_date=start_date, end_date=end_date, category=category
+    )
+    next_cursor = encode_cursor(rows[-1].date, rows[-1].id) if has_more else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+# Default look-back per summary granularity when no start_date is given
+SUMMARY_DEFAULT_RANGE = {"day": timedelta(days=30), "week": timedelta(weeks=12), "month": timedelta(days=365)}
+
+@app.get("/expenses/summary", response_model=schemas.SpendingSummary, tags=["Data"])
+def get_expense_summary(
+    period: str = Query("month", pattern="^(day|week|month)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Per-category and per-period (day/week/month) spending totals, grouped in the database.
+    Monthly summaries read only the expense_monthly_rollup table.
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or (end_date - SUMMARY_DEFAULT_RANGE[period])
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date must be on or before end_date.")
+    return crud.get_spending_summary(db, user.id, period, start_date, end_date)
+
+@app.post("/expenses/bulk", response_model=schemas.BulkImportResult, tags=["Data"])
+async def bulk_create_expenses(
+    request: Request,
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Imports many expenses from a streamed CSV (header: amount,category,note,date) or NDJSON body.
+    Rows are validated as they arrive; bad rows are reported and skipped, the rest are saved
+    together in one transaction.
+    """
+    return await run_bulk_import(
+        request, detect_format(request, format), schemas.ExpenseCreate,
+        to_row=lambda expense: crud.expense_row(expense, user.id),
+        insert_chunk=lambda rows: crud.bulk_insert_expenses(db, rows),
+        finish=lambda: crud.finish_expense_import(db, user.id),
+        rollback=db.rollback
+    )
 
 # --- 3. AI & SUMMARY ROUTES (Core Innovation) ---
+# NOTE: Routes that call Gemini are `async def` and await the *_async coach functions, so slow LLM
+# calls no longer hold threadpool threads needed by DB-only routes. Any blocking DB work inside
+# them MUST go through run_in_threadpool to keep the event loop free.
 # main.py (Add to Section 3: AI & SUMMARY ROUTES)
 
 @app.get("/gamification/streak", tags=["Gamification"])
-def get_user_streak(
-    db: Session = Depends(get_db), 
-    current_user_email: str = Depends(get_current_user_email)
+async def get_user_streak(
+    db: AsyncSession = Depends(get_async_db), 
+    user: schemas.User = Depends(get_current_user_async)
 ):
     """Returns the user's current expense logging streak."""
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-        
-    streak_count = crud.calculate_consecutive_days_logged(db, user_id=user.id)
+    streak_count = await crud.get_logging_streak_async(db, user_id=user.id)
     
     return {"streak": streak_count}
 
 @app.get("/market/live-feed", tags=["AI"])
-def get_mock_market_feed(
-    db: Session = Depends(get_db), 
-    current_user_email: str = Depends(get_current_user_email)
+async def get_mock_market_feed(
+    db: AsyncSession = Depends(get_async_db), 
+    user: schemas.User = Depends(get_current_user_async)
 ):
     """
-    Fetches the user's actual portfolio holdings from the DB and calculates
-    their real-time mocked value (Paper Trading).
+    Returns the user's paper portfolio valued at the current market tick.
+    Served from the per-user valuation cache: a DB read only after a trade (or cache expiry).
     """
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    # 1. Retrieve the user's held assets
-    holdings = crud.get_user_portfolio_holdings(db, user.id)
-    
-    portfolio_summary = []
-    total_market_value = 0.0
+    valuation = await crud.get_portfolio_valuation_async(db, user.id)
+    return {**valuation, "last_update": datetime.now().isoformat()}
 
-    for asset in holdings:
-        # 2. Get the current mock price from the stable source (defined in crud.py)
-        current_price = crud.get_current_mock_price(asset.symbol)
-        
-        # 3. Calculate metrics
-        current_value = asset.shares * current_price
-        total_market_value += current_value
-        
-        # Calculate Gain/Loss Percentage
-        if asset.average_cost > 0:
-            gain_loss_percent = ((current_price - asset.average_cost) / asset.average_cost) * 100
-        else:
-            gain_loss_percent = 0.0
-            
-        portfolio_summary.append({
-            "symbol": asset.symbol,
-            "shares": round(asset.shares, 4),
-            "current_price": round(current_price, 2),
-            "average_cost": round(asset.average_cost, 2),
-            "current_value": round(current_value, 2),
-            "gain_loss_percent": round(gain_loss_percent, 2)
-        })
-
-    # 4. Return the dynamic summary
-    return {
-        "total_portfolio_value": round(total_market_value, 2),
-        "holdings": portfolio_summary,
-        "last_update": datetime.now().isoformat()
-    }
+@app.websocket("/market/ws")
+async def market_price_stream(websocket: WebSocket, token: str = Query(...)):
+    """
+    Pushes every market tick ({'tick', 'as_of', 'prices'}) to the client, starting with the current one.
+    Browsers can't set headers on a WebSocket, so the JWT is passed as ?token=.
+    Each tick is computed and serialized once and shared by all subscribers.
+    """
+    try:
+        get_current_token_data(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    market_ticker.start()
+    queue = market_ticker.subscribe()
+
+    async def push():
+        await websocket.send_text(market_ticker.payload())
+        while True:
+            await websocket.send_text(await queue.get())
+
+    async def drain():
+        # Clients don't send anything; reading just notices the disconnect
+        async for _ in websocket.iter_text():
+            pass
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        market_ticker.unsubscribe(queue)
 
 # main.py (Add to Section 3: AI & SUMMARY ROUTES)
 
@@ -220,38 +339,110 @@ def get_daily_checkin_prompt(
     # Return a random prompt to keep the app fresh
     return random.choice(prompts)
 
+async def _prepare_chat(db: Session, user_id: int, chat_message: schemas.ChatMessage):
+    """Loads (or starts) the chat session and returns (session_id, summary, windowed_history)."""
+    chat_session, turns = await run_in_threadpool(crud.load_chat_context, db, user_id, chat_message.session_id, chat_message.new_session)
+    history = [{"role": t.role, "message": t.message} for t in turns]
+    summary, window = build_chat_window(chat_session.summary, history, chat_message.message)
+    return chat_session.id, summary, window
+
+def _save_chat_exchange(session_id: int, user_message: str, reply: str):
+    """Persists a finished exchange with its own session (used where the request session may be gone)."""
+    db = SessionLocal()
+    try:
+        crud.add_chat_exchange(db, session_id, user_message, reply)
+    finally:
+        db.close()
+
 @app.post("/chat", tags=["AI"])
-def handle_chat(
+async def handle_chat(
     chat_message: schemas.ChatMessage,
-    # NOTE: chat_history should be passed by Muneer's frontend
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db), 
-    current_user_email: str = Depends(get_current_user_email)
+    user: schemas.User = Depends(get_current_user)
 ):
-    # Dummy chat history for MVP (Muneer needs to send the real history)
-    chat_history = [
-        {"role": "user", "message": "What is compound interest?"},
-        {"role": "model", "message": "It's money earning money!"}
-    ]
-    
-    response_text = get_chat_response(chat_message.message, chat_history)
-    return {"reply": response_text}
+    """Replies within a server-side chat session. Omit session_id to continue the latest one (new_session=true starts over)."""
+    started = time.perf_counter()
+    session_id, summary, history = await _prepare_chat(db, user.id, chat_message)
+
+    response_text = await get_chat_response_async(chat_message.message, history, summary)
+    await run_in_threadpool(crud.add_chat_exchange, db, session_id, chat_message.message, response_text)
+    # Summary rolling runs after the response is sent, so it never adds chat latency
+    background_tasks.add_task(roll_chat_summary, session_id, user.id)
+
+    CHAT_TOTAL.observe(time.perf_counter() - started)
+    return {"reply": response_text, "session_id": session_id}
+
+def _sse(payload: Dict, event: str = None) -> str:
+    """Formats one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(payload)}\n\n"
+
+@app.post("/chat/stream", tags=["AI"])
+async def handle_chat_stream(
+    chat_message: schemas.ChatMessage,
+    db: Session = Depends(get_db), 
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Streaming version of /chat over Server-Sent Events.
+    Sends `data: {"delta": "..."}` frames as tokens arrive, then an `event: done` frame
+    with the session id, time-to-first-token and total time (or an `event: error` frame).
+    """
+    started = time.perf_counter()
+    session_id, summary, history = await _prepare_chat(db, user.id, chat_message)
+
+    async def event_stream():
+        ttft = None
+        chunks = []
+        replies = stream_chat_response_async(chat_message.message, history, summary)
+        try:
+            async for delta in replies:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    CHAT_STREAM_TTFT.observe(ttft)
+                chunks.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as e:
+            yield _sse({"detail": f"Chat stream failed: {e}"}, event="error")
+            return
+        finally:
+            # On a client disconnect, close the Gemini stream now so its LLM slot is released
+            # right away rather than whenever the abandoned generator is garbage-collected
+            await replies.aclose()
+
+        await run_in_threadpool(_save_chat_exchange, session_id, chat_message.message, "".join(chunks))
+
+        total = time.perf_counter() - started
+        CHAT_STREAM_TOTAL.observe(total)
+        yield _sse({
+            "session_id": session_id,
+            "time_to_first_token_ms": round((ttft or total) * 1000, 1),
+            "total_ms": round(total * 1000, 1)
+        }, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop proxies (e.g. nginx on Render) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Summary rolling runs once the stream has closed, so it never holds the connection open
+        background=BackgroundTask(roll_chat_summary, session_id, user.id)
+    )
 
 @app.post("/simulate/invest/action", tags=["AI"])
-def simulate_investment_action(
+async def simulate_investment_action(
     action_data: schemas.InvestmentAction,
-    db: Session = Depends(get_db), 
-    current_user_email: str = Depends(get_current_user_email)
+    db: AsyncSession = Depends(get_async_db), 
+    user: schemas.User = Depends(get_current_user_async)
 ):
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        
-    transaction_status = execute_investment_simulation(user.id, action_data.model_dump())
+    transaction_status = await execute_investment_simulation_async(user.id, action_data.model_dump())
     
     # 1. CRITICAL: If successful, attempt the database transaction
     if transaction_status.get('status') == 'success':
         try:
             # If the commit succeeds, the code continues.
-            crud.update_portfolio_shares(
+            await crud.update_portfolio_shares_async(
                 db, 
                 user_id=user.id, 
                 symbol=action_data.symbol, 
@@ -267,16 +458,34 @@ def simulate_investment_action(
     # we return the transaction_status.
     return transaction_status
 
+@app.post("/simulate/invest/batch", response_model=schemas.InvestmentBatchResult, tags=["AI"])
+async def simulate_investment_batch(
+    batch: schemas.InvestmentBatch,
+    db: Session = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Executes a basket of paper trades (e.g. a rebalance) all-or-nothing in a single transaction.
+    Any invalid order rejects the whole basket with 400 and nothing is traded.
+    The basket gets one advice nudge (from the pre-generated pool), however many orders it has.
+    """
+    orders = [order.model_dump() for order in batch.orders]
+    fills = await run_in_threadpool(crud.execute_trade_batch, db, user.id, orders)
+    nudge = nudge_pool.take("Basket", "success")
+    return {
+        "status": "success",
+        "message": f"Basket CONFIRMED! Executed {len(fills)} order(s) (Paper).",
+        "advice_nudge": nudge,
+        "fills": fills
+    }
+
 @app.post("/simulate/invest/learn", tags=["AI"])
-def simulate_investment(
+async def simulate_investment(
     simulation_input: schemas.SimulatorInput, 
     db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user_email)
+    user: schemas.User = Depends(get_current_user)
 ):
     """Runs a mock investment simulation and returns AI-generated micro-course."""
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-        
     # 1. Run the structured backend calculation
     result = run_mock_simulation(
         start=simulation_input.start,
@@ -284,6 +493,17 @@ def simulate_investment(
         years=simulation_input.years,
         risk=simulation_input.risk
     )
+    if simulation_input.mode == "monte_carlo":
+        # CPU-bound NumPy work: keep it off the event loop
+        result["monte_carlo"] = await run_in_threadpool(
+            run_monte_carlo,
+            start=simulation_input.start,
+            monthly=simulation_input.monthly,
+            years=simulation_input.years,
+            risk=simulation_input.risk,
+            paths=simulation_input.paths,
+            seed=simulation_input.seed
+        )
     
     # 2. Generate AI course content
     user_data = {
@@ -291,7 +511,7 @@ def simulate_investment(
         "goal_name": "Investment Exploration"
     }
 
-    course_content = generate_investment_micro_course(user_data, result)
+    course_content = await generate_investment_micro_course_async(user_data, result)
     
     # 3. Save the session data to the database
     # Create a Pydantic object for saving, adding the course content and projected value
@@ -303,27 +523,61 @@ def simulate_investment(
         projected_value=result['projected_final_value']
     )
     
-    crud.create_simulator_session(db, session_data=session_schema, user_id=user.id)
+    await run_in_threadpool(crud.create_simulator_session, db, session_data=session_schema, user_id=user.id)
     
     return {
         "simulation_result": result,
         "course_content": course_content
     }
 
+SIMULATOR_GRID_MAX_AXIS = 200
+SIMULATOR_GRID_MAX_CELLS = 250_000
+
+def _grid_axis(name: str, axis: schemas.SimulatorRange, integer: bool = False) -> List[float]:
+    if integer and any(v != int(v) for v in (axis.min, axis.max, axis.step)):
+        # Fractional steps would truncate into duplicate rows (e.g. years 1, 1.5, 2 -> 1, 1, 2)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{name}' min, max and step must be whole numbers.")
+    if axis.max < axis.min:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{name}' max must be >= min.")
+    count = int((axis.max - axis.min) / axis.step + 1e-9) + 1
+    if count > SIMULATOR_GRID_MAX_AXIS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{name}' has {count} steps (max {SIMULATOR_GRID_MAX_AXIS}).")
+    return [round(axis.min + i * axis.step, 6) for i in range(count)]
+
+@app.post("/simulate/grid", response_model=schemas.SimulatorGrid, tags=["AI"])
+def simulate_grid(
+    grid_input: schemas.SimulatorGridInput,
+    current_user_email: str = Depends(get_current_user_email)
+):
+    """
+    AI-free scenario grid for the simulator sliders: evaluates every start/monthly/years/risk
+    combination in one vectorized pass so the frontend can scrub locally. Saves nothing.
+    """
+    starts = _grid_axis("start", grid_input.start)
+    monthlies = _grid_axis("monthly", grid_input.monthly)
+    years = [int(y) for y in _grid_axis("years", grid_input.years, integer=True)]
+    risks = grid_input.risks
+
+    shape = [len(risks), len(starts), len(monthlies), len(years)]
+    if shape[0] * shape[1] * shape[2] * shape[3] > SIMULATOR_GRID_MAX_CELLS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Grid too large (max {SIMULATOR_GRID_MAX_CELLS} cells).")
+
+    values = run_mock_simulation_grid(starts, monthlies, years, risks)
+    return {
+        "axes": {"risk": risks, "start": starts, "monthly": monthlies, "years": years},
+        "shape": shape,
+        "projected_final_value": np.rint(values).astype(np.int64).ravel().tolist()
+    }
+
 @app.get("/market/asset-history/{symbol}", tags=["AI"])
 def get_asset_history(
     symbol: str, 
-    # FIX IS HERE: Inject the database dependency
     db: Session = Depends(get_db), 
-    current_user_email: str = Depends(get_current_user_email)
+    user: schemas.User = Depends(get_current_user)
 ):
     """Provides historical data for charting (now from static mock store)."""
     
-    # 1. Verification and DB Check
-    user = crud.get_user_by_email(db, email=current_user_email) # 'db' is now defined!
-    if not user: 
-        # Since auth passed, this user should exist, but it's good practice
-        raise HTTPException(status_code=404, detail="User not found") 
+    # 1. Verification is handled by get_current_user (404s if the user no longer exists)
         
     # 2. Retrieve data from the new static store
     history = get_mock_asset_history(symbol.upper())
@@ -362,25 +616,19 @@ def calculate_consecutive_days_logged(db: Session, user_id: int) -> int:
     return streak
 
 @app.get("/course/next-lesson", response_model=schemas.LessonContent, tags=["AI"])
-def get_next_lesson_route(db: Session = Depends(get_db), current_user_email: str = Depends(get_current_user_email)):
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-        
-    lesson_data = generate_next_lesson(
+async def get_next_lesson_route(db: Session = Depends(get_db), user: schemas.User = Depends(get_current_user)):
+    lesson_data = await generate_next_lesson_async(
         user_data={"fixed_budget": user.fixed_budget, "financial_confidence": user.financial_confidence}, 
         lesson_index=user.lesson_progress + 1
     )
     
     # Check if the next lesson criteria is met (Backend check)
-    is_unlocked = check_assignment_status(db, user.id, lesson_data['unlock_criteria_key'])
+    is_unlocked = await run_in_threadpool(check_assignment_status, db, user.id, lesson_data['unlock_criteria_key'])
     
     return schemas.LessonContent(**lesson_data, is_unlocked=is_unlocked) # Note: Requires adding is_unlocked to LessonContent schema if used
 
 @app.post("/course/complete-lesson", response_model=schemas.User, tags=["AI"])
-def complete_lesson(db: Session = Depends(get_db), current_user_email: str = Depends(get_current_user_email)):
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: raise HTTPException(status_code=404, detail="User not found")
-    
+def complete_lesson(db: Session = Depends(get_db), user: schemas.User = Depends(get_current_user)):
     # Check if the current assignment is met before advancing
     current_lesson_index = user.lesson_progress + 1
     # NOTE: You'd need to fetch the criteria key here first, but for MVP simplicity:
@@ -394,7 +642,7 @@ def complete_lesson(db: Session = Depends(get_db), current_user_email: str = Dep
 def check_assignment_status(db: Session, user_id: int, criteria_key: str) -> bool:
     """Helper function to check if the assignment criteria is met."""
     if criteria_key == 'consecutive_logs_3':
-        return crud.calculate_consecutive_days_logged(db, user_id) >= 3
+        return crud.get_logging_streak(db, user_id) >= 3
     if criteria_key == 'simulator_run_min_50':
         return crud.check_for_min_contribution_session(db, user_id, min_amount=50.0)
     if criteria_key == 'expense_categories_5':
@@ -405,15 +653,45 @@ def check_assignment_status(db: Session, user_id: int, criteria_key: str) -> boo
 def create_income(
     income: schemas.IncomeCreate,
     db: Session = Depends(get_db),
-    current_user_email: str = Depends(get_current_user_email)
+    user: schemas.User = Depends(get_current_user)
 ):
     """Logs a new income entry for the current user."""
-    user = crud.get_user_by_email(db, email=current_user_email)
-    if not user: 
-        raise HTTPException(status_code=404, detail="User not found")
-    
     return crud.create_income(db=db, income=income, user_id=user.id)
 
+@app.get("/incomes", response_model=schemas.IncomePage, tags=["Data"])
+def list_incomes(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_MAX),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    source: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """Income history, newest first, with cursor pagination."""
+    rows, has_more = crud.get_user_incomes_page(
+        db, user.id, limit=limit, after=decode_cursor(cursor),
+        start_date=start_date, end_date=end_date, source=source
+    )
+    next_cursor = encode_cursor(rows[-1].date, rows[-1].id) if has_more else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+@app.post("/incomes/bulk", response_model=schemas.BulkImportResult, tags=["Data"])
+async def bulk_create_incomes(
+    request: Request,
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """Imports many incomes from a streamed CSV (header: amount,source,date) or NDJSON body."""
+    return await run_bulk_import(
+        request, detect_format(request, format), schemas.IncomeCreate,
+        to_row=lambda income: crud.income_row(income, user.id),
+        insert_chunk=lambda rows: crud.bulk_insert_incomes(db, rows),
+        finish=db.commit,
+        rollback=db.rollback
+    )
+
 # --- 4. RUN SERVER (Development Only) ---
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,42 @@
+# scripts/backfill_streaks.py (One-shot job: populate the materialized streak counters)
+#
+# Usage (from backend/):  python -m scripts.backfill_streaks
+# Safe to re-run: every user's counters are recomputed from their full expense history.
+
+from sqlalchemy import inspect, text
+from database.database import SessionLocal, engine
+from database import crud, models
+
+STREAK_COLUMNS = {
+    "current_streak": "INTEGER NOT NULL DEFAULT 0",
+    "longest_streak": "INTEGER NOT NULL DEFAULT 0",
+    "last_logged_date": "DATE",
+}
+
+def add_missing_columns():
+    """create_all() does not alter existing tables, so add the new user columns if needed."""
+    existing = {c["name"] for c in inspect(engine).get_columns(models.User.__tablename__)}
+    with engine.begin() as conn:
+        for name, ddl in STREAK_COLUMNS.items():
+            if name not in existing:
+                print(f"Adding users.{name}")
+                conn.execute(text(f"ALTER TABLE users ADD COLUMN {name} {ddl}"))
+
+def backfill(batch_size: int = 500):
+    db = SessionLocal()
+    try:
+        user_ids = [row[0] for row in db.query(models.User.id).order_by(models.User.id).all()]
+        for i, user_id in enumerate(user_ids, start=1):
+            counters = crud.recompute_logging_streak(db, user_id)
+            db.query(models.User).filter(models.User.id == user_id).update(counters)
+            if i % batch_size == 0:
+                db.commit()
+                print(f"Backfilled {i}/{len(user_ids)} users")
+        db.commit()
+        print(f"Backfilled streak counters for {len(user_ids)} users.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_missing_columns()
+    backfill()
@@ -0,0 +1,301 @@
+# scripts/bench_load.py (End-to-end load benchmark with a local stand-in for Gemini)
+#
+# Usage (from backend/):
+#   python -m scripts.bench_load [--mix realistic] [--duration 30] [--concurrency 16] [--users 20]
+#                                [--llm-latency-ms 800] [--llm-jitter 0.3] [--llm-output-tokens 200]
+#                                [--database-url URL] [--save-baseline FILE] [--baseline FILE] [--tolerance 0.25]
+#
+# Boots the app in-process (httpx ASGI transport, no network) against a throwaway SQLite file, or
+# a local Postgres via --database-url, and replaces coach_agent's genai client with FakeGenaiClient:
+# fixed latency (+/- jitter) and a fixed number of output tokens, with usage metadata like the
+# real API. Closed-loop workers then pick routes from the chosen mix for --duration seconds and the
+# report gives throughput and p50/p95/p99 per route.
+#
+# Baselines: --save-baseline writes the run as JSON; --baseline compares against one and exits 1
+# if any route's p95 grew (or throughput fell) by more than --tolerance. Compare runs made with the
+# same flags on the same machine, and long enough to be stable (runs under ~30s are noisy, SQLite's
+# single writer especially). The load generator shares the process (and the CPU) with the app, so
+# numbers are for run-to-run comparison, not capacity planning.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+_tmp = tempfile.TemporaryDirectory()
+_parser = argparse.ArgumentParser()
+_parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(_tmp.name, 'bench_load.db')}")
+_args, _ = _parser.parse_known_args()
+# Must be set before the app (and its engines) are imported
+os.environ["SUPABASE_DATABASE_URL"] = _args.database_url
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+from google.genai import types
+import main
+from ai import coach_agent
+from database.database import create_db_and_tables
+from utils.metrics import LatencyRecorder
+
+# Relative weights per route. "realistic" mirrors the app's traffic: dashboards poll the live feed
+# and streak, users log expenses and trade, and a smaller share chats or (re)authenticates.
+MIXES = {
+    "realistic": {"live-feed": 30, "expense": 20, "trade": 20, "streak": 15, "chat": 8, "login": 5, "signup": 2},
+    "read-heavy": {"live-feed": 50, "streak": 30, "expense": 10, "trade": 10},
+    "write-heavy": {"expense": 45, "trade": 45, "live-feed": 10},
+    "auth": {"login": 70, "signup": 30},
+    "chat": {"chat": 80, "live-feed": 20},
+}
+PASSWORD = "bench-password"
+SYMBOLS = ["AAPL", "MSFT", "VTI", "GOLD_ETF"]
+
+# --- Gemini stand-in ---
+
+class _FakeResponse:
+    def __init__(self, text: str, input_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=input_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=input_tokens + output_tokens,
+        )
+
+class _FakeModels:
+    def __init__(self, fake: "FakeGenaiClient"):
+        self._fake = fake
+
+    def generate_content(self, model: str, contents, config=None):
+        time.sleep(self._fake.latency())
+        return self._fake.response(contents)
+
+class _FakeAsyncModels:
+    def __init__(self, fake: "FakeGenaiClient"):
+        self._fake = fake
+
+    async def generate_content(self, model: str, contents, config=None):
+        await asyncio.sleep(self._fake.latency())
+        return self._fake.response(contents)
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        chunks = max(1, self._fake.output_tokens // 20)
+        delay = self._fake.latency() / chunks
+
+        async def stream():
+            for i in range(chunks):
+                await asyncio.sleep(delay)
+                last = i == chunks - 1
+                yield _FakeResponse("word " * 20, 0, 0) if not last else self._fake.response(contents, words=20)
+        return stream()
+
+class FakeGenaiClient:
+    """Mimics the parts of genai.Client that coach_agent uses (client.models and client.aio.models)."""
+
+    def __init__(self, latency_ms: float, jitter: float, output_tokens: int, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.output_tokens = output_tokens
+        self._rng = random.Random(seed)
+        self.models = _FakeModels(self)
+        self.aio = type("Aio", (), {})()
+        self.aio.models = _FakeAsyncModels(self)
+
+    def latency(self) -> float:
+        return max(0.0, self.latency_ms / 1000 * self._rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def response(self, contents, words: int = None) -> _FakeResponse:
+        prompt = contents if isinstance(contents, str) else str(contents)
+        # One line per output "token" so the nudge pool's one-nudge-per-line parsing gets real entries
+        text = "\n".join(f"token{i}" for i in range(words or self.output_tokens))
+        return _FakeResponse(text, max(1, len(prompt) // 4), self.output_tokens) # ~4 characters per token
+
+# --- Load generation ---
+
+class BenchUser:
+    def __init__(self, email: str, token: str):
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+class Bench:
+    def __init__(self, client: httpx.AsyncClient, users, run_id: str, seed: int):
+        self.client = client
+        self.users = users
+        self.run_id = run_id
+        self.rng = random.Random(seed)
+        self.signups = 0
+        self.recorders = {}
+        self.statuses = {}
+        self.recording = False
+
+    async def request(self, route: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        response = await self.client.request(method, path, **kwargs)
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            self.recorders.setdefault(route, LatencyRecorder(route, max_samples=1_000_000)).observe(elapsed)
+            statuses = self.statuses.setdefault(route, {})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return response
+
+    async def op(self, route: str):
+        user = self.rng.choice(self.users)
+        if route == "signup":
+            self.signups += 1
+            await self.request(route, "POST", "/signup", json={"email": f"load{self.run_id}-{self.signups}@example.com", "password": PASSWORD})
+        elif route == "login":
+            await self.request(route, "POST", "/login", json={"email": user.email, "password": PASSWORD})
+        elif route == "expense":
+            await self.request(route, "POST", "/expenses", headers=user.headers, json={
+                "amount": round(self.rng.uniform(2, 80), 2), "category": self.rng.choice(["Food", "Travel", "Bills", "Fun"])})
+        elif route == "streak":
+            await self.request(route, "GET", "/gamification/streak", headers=user.headers)
+        elif route == "live-feed":
+            await self.request(route, "GET", "/market/live-feed", headers=user.headers)
+        elif route == "trade":
+            # Mostly buys; sells are small so they usually fill against the seeded position
+            action = "Buy" if self.rng.random() < 0.7 else "Sell"
+            await self.request(route, "POST", "/simulate/invest/action", headers=user.headers, json={
+                "asset_type": "Stock", "symbol": self.rng.choice(SYMBOLS), "action": action,
+                "amount": round(self.rng.uniform(10, 100 if action == "Buy" else 30), 2)})
+        elif route == "chat":
+            await self.request(route, "POST", "/chat", headers=user.headers, json={"message": "How can I save more on groceries?"})
+
+    async def run(self, mix: dict, duration: float, concurrency: int, recording: bool):
+        self.recording = recording
+        routes, weights = list(mix), list(mix.values())
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.op(self.rng.choices(routes, weights)[0])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+async def setup_users(client: httpx.AsyncClient, count: int, run_id: str):
+    users = []
+    for i in range(count):
+        email = f"bench{run_id}-{i}@example.com"
+        response = await client.post("/signup", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        user = BenchUser(email, response.json()["access_token"])
+        # Opening positions, so sells in the mix have something to sell
+        for symbol in SYMBOLS:
+            await client.post("/simulate/invest/action", headers=user.headers,
+                              json={"asset_type": "Stock", "symbol": symbol, "action": "Buy", "amount": 500})
+        users.append(user)
+    return users
+
+# --- Reporting ---
+
+def build_report(bench: Bench, elapsed: float, args) -> dict:
+    routes = {}
+    for route, recorder in sorted(bench.recorders.items()):
+        snapshot = recorder.snapshot()
+        statuses = bench.statuses[route]
+        errors = sum(n for code, n in statuses.items() if code >= 500)
+        routes[route] = {
+            "count": snapshot["count"],
+            "rps": round(snapshot["count"] / elapsed, 1),
+            "p50_ms": snapshot["p50_ms"],
+            "p95_ms": snapshot["p95_ms"],
+            "p99_ms": snapshot["p99_ms"],
+            "mean_ms": snapshot["mean_ms"],
+            "error_rate": round(errors / snapshot["count"], 4),
+            "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "database": args.database_url.split(":", 1)[0],
+            "mix": args.mix, "duration_s": args.duration, "concurrency": args.concurrency, "users": args.users,
+            "llm_latency_ms": args.llm_latency_ms, "llm_jitter": args.llm_jitter, "llm_output_tokens": args.llm_output_tokens,
+        },
+        "overall": {"requests": total, "rps": round(total / elapsed, 1), "elapsed_s": round(elapsed, 2)},
+        "routes": routes,
+    }
+
+def print_report(report: dict):
+    meta, overall = report["meta"], report["overall"]
+    print(f"\nmix={meta['mix']} concurrency={meta['concurrency']} users={meta['users']} db={meta['database']} "
+          f"llm={meta['llm_latency_ms']}ms±{int(meta['llm_jitter'] * 100)}% cpus={meta['cpus']}")
+    print(f"{'route':<12} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err%':>6}  statuses")
+    for route, r in report["routes"].items():
+        print(f"{route:<12} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['error_rate'] * 100:>6.2f}  {r['statuses']}")
+    print(f"{'TOTAL':<12} {overall['requests']:>7} {overall['rps']:>8.1f}")
+
+# Latency growth below this is treated as noise however large the ratio (sub-ms routes jitter a lot)
+MIN_REGRESSION_MS = 2.0
+
+def compare(report: dict, baseline: dict, tolerance: float) -> int:
+    """Prints per-route deltas against the baseline and returns how many regressed."""
+    regressions = 0
+    print(f"\nvs baseline from {baseline['meta']['created_at']} (tolerance {tolerance:.0%}):")
+    base_rps, rps = baseline["overall"]["rps"], report["overall"]["rps"]
+    throughput_ok = rps >= base_rps * (1 - tolerance)
+    regressions += not throughput_ok
+    print(f"  {'throughput':<12} {base_rps:>8.1f} -> {rps:>8.1f} req/s  {'ok' if throughput_ok else 'REGRESSED'}")
+    for route, r in report["routes"].items():
+        base = baseline["routes"].get(route)
+        if base is None:
+            print(f"  {route:<12} (not in baseline)")
+            continue
+        grew = r["p95_ms"] - base["p95_ms"]
+        ok = grew <= max(base["p95_ms"] * tolerance, MIN_REGRESSION_MS) and r["error_rate"] <= base["error_rate"] + 0.01
+        regressions += not ok
+        print(f"  {route:<12} p95 {base['p95_ms']:>8.1f} -> {r['p95_ms']:>8.1f} ms  "
+              f"p99 {base['p99_ms']:>8.1f} -> {r['p99_ms']:>8.1f} ms  {'ok' if ok else 'REGRESSED'}")
+    return regressions
+
+async def bench(args) -> int:
+    coach_agent.client = FakeGenaiClient(args.llm_latency_ms, args.llm_jitter, args.llm_output_tokens, seed=args.seed)
+    create_db_and_tables()
+    run_id = str(int(time.time())) # Unique emails, so reruns against a persistent Postgres don't collide
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        users = await setup_users(client, args.users, run_id)
+        bench = Bench(client, users, run_id, args.seed)
+        if args.warmup > 0:
+            await bench.run(MIXES[args.mix], args.warmup, args.concurrency, recording=False)
+        elapsed = await bench.run(MIXES[args.mix], args.duration, args.concurrency, recording=True)
+
+    report = build_report(bench, elapsed, args)
+    print_report(report)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"FAILED: {regressions} regression(s)")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(parents=[_parser], add_help=False)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="realistic")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Unrecorded seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Latency spread, as a fraction of --llm-latency-ms")
+    parser.add_argument("--llm-output-tokens", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    sys.exit(asyncio.run(bench(parser.parse_args())))
@@ -0,0 +1,79 @@
+# scripts/bench_login.py (Login throughput benchmark: inline hashing vs. the hashing process pool)
+#
+# Usage (from backend/):  python -m scripts.bench_login [--logins 200] [--concurrency 16] [--workers 2]
+#
+# Boots the app in-process against a throwaway SQLite database and fires concurrent /login
+# requests while a probe keeps hitting GET / (a route that does no hashing). Reports login
+# throughput and the probe's latency, first with hashing inline in the request threadpool
+# (the old behaviour, PASSWORD_HASH_WORKERS=0), then in the process pool.
+# NOTE: the pool only adds throughput with spare cores; on one core the gain is in probe latency.
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["SUPABASE_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench_login.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+import main
+from auth import auth_service
+from database.database import create_db_and_tables
+
+CREDENTIALS = {"email": "bench@example.com", "password": "correct horse battery staple"}
+
+async def run_mode(client: httpx.AsyncClient, workers: int, logins: int, concurrency: int):
+    auth_service.PASSWORD_HASH_WORKERS = workers
+    await client.post("/login", json=CREDENTIALS) # Warm-up (starts the pool when workers > 0)
+
+    probe_latencies, statuses = [], {}
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/")
+            probe_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    remaining = iter(range(logins))
+    async def login_worker():
+        for _ in remaining:
+            response = await client.post("/login", json=CREDENTIALS)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    prober = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+
+    probe_ms = sorted(l * 1000 for l in probe_latencies)
+    label = "inline (threadpool)" if workers <= 0 else f"process pool x{workers}"
+    print(f"{label:<22} {logins / elapsed:7.1f} logins/s  statuses={statuses}  "
+          f"GET / p50={statistics.median(probe_ms):.1f}ms p95={probe_ms[int(len(probe_ms) * 0.95)]:.1f}ms")
+
+async def bench(logins: int, concurrency: int, workers: int):
+    create_db_and_tables()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/signup", json=CREDENTIALS)
+        print(f"{logins} logins, concurrency {concurrency}, {os.cpu_count()} CPU(s), "
+              f"PBKDF2 rounds={auth_service.PASSWORD_HASH_ROUNDS}, max pending={auth_service.PASSWORD_HASH_MAX_PENDING}")
+        await run_mode(client, 0, logins, concurrency)
+        await run_mode(client, workers, logins, concurrency)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=max(auth_service.PASSWORD_HASH_WORKERS, 1))
+    args = parser.parse_args()
+    asyncio.run(bench(args.logins, args.concurrency, args.workers))
+    sys.exit(0)
@@ -0,0 +1,161 @@
+# scripts/check_query_plans.py (Query-plan regression check for the per-user hot queries)
+#
+# Usage (from backend/):  python -m scripts.check_query_plans [DATABASE_URL]
+#
+# Seeds a database, runs every hot crud read, captures the SQL it issues and runs EXPLAIN on
+# each statement. Exits 1 if any plan falls back to a sequential (full table) scan.
+# - Default target is a throwaway SQLite file.
+# - For Postgres, pass a scratch database URL. Everything (tables included) runs inside one
+#   transaction that is rolled back, and seq scans are disabled so a Seq Scan in the plan means
+#   no usable index exists.
+
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import Session
+from database import crud, models
+
+N_USERS = 200
+EXPENSES_PER_USER = 60
+SYMBOLS = ["AAPL", "GOOG", "MSFT", "VTI", "GOLD_ETF"]
+
+def seed(conn):
+    """Bulk-inserts enough rows that per-user lookups are selective."""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    conn.execute(insert(models.User.__table__), [
+        {"id": i, "email": f"user{i}@finity.test", "hashed_password": "x", "current_streak": 0, "longest_streak": 0}
+        for i in range(1, N_USERS + 1)
+    ])
+    conn.execute(insert(models.Expense.__table__), [
+        {"owner_id": u, "amount": rng.uniform(1, 200), "category": rng.choice(["Food", "Rent", "Fun", "Travel", "Bills"]),
+         "date": now - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))}
+        for u in range(1, N_USERS + 1) for _ in range(EXPENSES_PER_USER)
+    ])
+    conn.execute(insert(models.Income.__table__), [
+        {"owner_id": u, "amount": 1000.0, "source": "Salary", "date": now - timedelta(days=30 * k)}
+        for u in range(1, N_USERS + 1) for k in range(12)
+    ])
+    conn.execute(insert(models.Portfolio.__table__), [
+        {"user_id": u, "symbol": s, "shares": 1.0, "average_cost": 100.0}
+        for u in range(1, N_USERS + 1) for s in SYMBOLS
+    ])
+    conn.execute(insert(models.SimulatorSession.__table__), [
+        {"user_id": u, "start_amount": 100.0, "monthly_contribution": 10.0 * k, "risk_level": "Low",
+         "course_summary": "-", "projected_value": 1000.0}
+        for u in range(1, N_USERS + 1) for k in range(3)
+    ])
+    conn.execute(insert(models.Goal.__table__), [
+        {"user_id": u, "name": "Emergency Fund", "target_amount": 5000.0, "current_amount": 0.0}
+        for u in range(1, N_USERS + 1)
+    ])
+    conn.execute(insert(models.ChatSession.__table__), [
+        {"id": u, "user_id": u, "summary": "", "summarized_through_id": 0} for u in range(1, N_USERS + 1)
+    ])
+    conn.execute(insert(models.ChatTurn.__table__), [
+        {"session_id": u, "role": "user" if k % 2 == 0 else "model", "message": "hi"}
+        for u in range(1, N_USERS + 1) for k in range(10)
+    ])
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    crud.rebuild_expense_rollup(db)
+    db.close()
+    conn.execute(text("ANALYZE"))
+
+USER_ID = N_USERS // 2
+TODAY = datetime.utcnow().date()
+
+# (label, crud call) for every hot per-user read
+HOT_QUERIES = [
+    ("get_user_by_email", lambda db: crud.get_user_by_email(db, f"user{USER_ID}@finity.test")),
+    ("get_user_by_id", lambda db: crud.get_user_by_id(db, USER_ID)),
+    ("get_user_expenses", lambda db: crud.get_user_expenses(db, USER_ID)),
+    ("get_logging_streak", lambda db: crud.get_logging_streak(db, USER_ID)),
+    ("calculate_consecutive_days_logged", lambda db: crud.calculate_consecutive_days_logged(db, USER_ID)),
+    ("_logged_days_between", lambda db: crud._logged_days_between(db, USER_ID, TODAY - timedelta(days=30), TODAY)),
+    ("count_unique_expense_categories", lambda db: crud.count_unique_expense_categories(db, USER_ID)),
+    ("check_for_min_contribution_session", lambda db: crud.check_for_min_contribution_session(db, USER_ID)),
+    ("get_asset_in_portfolio", lambda db: crud.get_asset_in_portfolio(db, USER_ID, "MSFT")),
+    ("get_user_portfolio_holdings", lambda db: crud.get_user_portfolio_holdings(db, USER_ID)),
+    ("get_spending_summary[month]", lambda db: crud.get_spending_summary(db, USER_ID, "month", TODAY - timedelta(days=365), TODAY)),
+    ("get_spending_summary[week]", lambda db: crud.get_spending_summary(db, USER_ID, "week", TODAY - timedelta(weeks=12), TODAY)),
+    ("get_user_expenses_page", lambda db: crud.get_user_expenses_page(db, USER_ID, after=(datetime.utcnow() - timedelta(days=30), 10**9))),
+    ("get_user_incomes", lambda db: crud.get_user_incomes(db, USER_ID)),
+    ("get_user_goals", lambda db: crud.get_user_goals(db, USER_ID)),
+    ("load_chat_context", lambda db: crud.load_chat_context(db, USER_ID, USER_ID)),
+]
+
+def _seq_scans_postgres(conn, statement, parameters):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    found, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") == "Seq Scan":
+            found.append(node.get("Relation Name"))
+        stack.extend(node.get("Plans", []))
+    return found
+
+def _seq_scans_sqlite(conn, statement, parameters):
+    tables = set(models.Base.metadata.tables)
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    # 'SCAN <table>' (with or without a covering index) is a full scan; 'SEARCH' is an index probe
+    return [row[-1] for row in rows if row[-1].startswith("SCAN ") and row[-1].split()[1] in tables]
+
+def check(database_url: str) -> int:
+    engine = create_engine(database_url)
+    dialect = engine.dialect.name
+    captured = []
+    capturing = {"on": False}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if capturing["on"] and statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    failures = 0
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            models.Base.metadata.create_all(bind=conn)
+            seed(conn)
+            if dialect == "postgresql":
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+            explain = _seq_scans_postgres if dialect == "postgresql" else _seq_scans_sqlite
+
+            db = Session(bind=conn, join_transaction_mode="create_savepoint")
+            for label, call in HOT_QUERIES:
+                captured.clear()
+                capturing["on"] = True
+                try:
+                    call(db)
+                except Exception as e:
+                    # Safety net: a query that fails to run (or decode) on this dialect still had its SQL captured
+                    print(f"  ({label} raised {type(e).__name__}; checking its SQL anyway)")
+                finally:
+                    capturing["on"] = False
+
+                for statement, parameters in captured:
+                    scans = explain(conn, statement, parameters)
+                    if scans:
+                        failures += 1
+                        print(f"FAIL {label}: sequential scan on {scans}\n     {' '.join(statement.split())}")
+                    else:
+                        print(f"ok   {label}")
+            db.close()
+        finally:
+            trans.rollback()
+    engine.dispose()
+
+    print(f"{failures} statement(s) fell back to a sequential scan.")
+    return failures
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(1 if check(sys.argv[1]) else 0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.exit(1 if check(f"sqlite:///{os.path.join(tmp, 'query_plans.db')}") else 0)
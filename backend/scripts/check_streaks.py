@@ -0,0 +1,39 @@
+# scripts/check_streaks.py (Consistency checker for the materialized streak counters)
+#
+# Usage (from backend/):  python -m scripts.check_streaks
+# Compares the stored counters against a full recomputation, and get_logging_streak against
+# the scan-based calculate_consecutive_days_logged. Exits 1 if any user disagrees.
+
+import sys
+from database.database import SessionLocal
+from database import crud, models
+
+def check() -> int:
+    db = SessionLocal()
+    mismatches = 0
+    try:
+        users = db.query(
+            models.User.id, models.User.current_streak, models.User.longest_streak, models.User.last_logged_date
+        ).order_by(models.User.id).all()
+
+        for user in users:
+            expected = crud.recompute_logging_streak(db, user.id)
+            stored = {
+                "current_streak": user.current_streak,
+                "longest_streak": user.longest_streak,
+                "last_logged_date": user.last_logged_date,
+            }
+            scanned = crud.calculate_consecutive_days_logged(db, user.id)
+            served = crud.get_logging_streak(db, user.id)
+
+            if stored != expected or served != scanned:
+                mismatches += 1
+                print(f"User {user.id}: stored={stored} expected={expected} served_streak={served} scanned_streak={scanned}")
+
+        print(f"Checked {len(users)} users, {mismatches} mismatches.")
+    finally:
+        db.close()
+    return mismatches
+
+if __name__ == "__main__":
+    sys.exit(1 if check() else 0)
@@ -0,0 +1,103 @@
+# scripts/check_write_statements.py (SQL statement budget check for the write endpoints)
+#
+# Usage (from backend/):  python -m scripts.check_write_statements [-v]
+#
+# Drives every write endpoint through the app (TestClient, throwaway SQLite file, AI calls
+# forced offline) and counts the SQL statements each request sends, on both the sync and the
+# async engine. Each endpoint gets one warm-up call first, so the user/token caches are hot and
+# the count is the steady state. Exits 1 if any endpoint issues more statements than its budget.
+# COMMITs are reported alongside but not budgeted (they are one per write by design).
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(prefix="finity_stmts_"), "check.db")
+os.environ["SUPABASE_DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ.setdefault("SECRET_KEY", "check-write-statements")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+import main
+from ai import coach_agent
+from database.database import async_engine, create_db_and_tables, engine
+
+# Statements per request, including the expected reads (user row lock, streak/rollup upserts, ...)
+BUDGETS = {
+    "POST /signup": 2,                  # email check, INSERT user RETURNING id
+    "POST /expenses": 3,                # user FOR UPDATE, INSERT expense, rollup upsert (+1 streak UPDATE on a day's first expense)
+    "POST /incomes": 1,                 # INSERT income RETURNING id
+    "POST /simulate/invest/action": 2,  # position upsert RETURNING, INSERT trade
+    "POST /simulate/invest/learn": 1,   # INSERT simulator session RETURNING id
+    "POST /course/complete-lesson": 2,  # streak read, UPDATE user ... RETURNING (which also re-primes the user cache)
+}
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def reset(self):
+        self.statements, self.commits = [], 0
+
+    def attach(self, sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(sync_engine, "commit", self._on_commit)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(" ".join(statement.split()))
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+def main_check(verbose: bool = False) -> int:
+    coach_agent.client = None # Offline fallbacks only: no network, deterministic
+    create_db_and_tables()
+    counter = StatementCounter()
+    counter.attach(engine)
+    counter.attach(async_engine.sync_engine)
+
+    client = TestClient(main.app)
+    signups = iter(range(1000))
+
+    def signup():
+        return client.post("/signup", json={"email": f"writer{next(signups)}@example.com", "password": "check"})
+
+    token = signup().json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    today = date.today()
+    # Three consecutive logged days so /course/complete-lesson is unlocked
+    for days_ago in (2, 1):
+        client.post("/expenses", json={"amount": 5, "category": "Food", "date": str(today - timedelta(days=days_ago))}, headers=headers)
+
+    calls = {
+        "POST /signup": signup,
+        "POST /expenses": lambda: client.post("/expenses", json={"amount": 12.5, "category": "Food"}, headers=headers),
+        "POST /incomes": lambda: client.post("/incomes", json={"amount": 1000, "source": "Salary"}, headers=headers),
+        "POST /simulate/invest/action": lambda: client.post(
+            "/simulate/invest/action", json={"asset_type": "Stock", "symbol": "AAPL", "amount": 100, "action": "Buy"}, headers=headers),
+        "POST /simulate/invest/learn": lambda: client.post(
+            "/simulate/invest/learn", json={"start": 1000, "monthly": 100, "years": 5, "risk": "medium"}, headers=headers),
+        "POST /course/complete-lesson": lambda: client.post("/course/complete-lesson", headers=headers),
+    }
+
+    failures = 0
+    print(f"{'endpoint':<30} {'status':>6} {'stmts':>6} {'budget':>6} {'commits':>7}")
+    for name, call in calls.items():
+        call() # Warm-up
+        counter.reset()
+        response = call()
+        used, budget = len(counter.statements), BUDGETS[name]
+        ok = response.status_code < 400 and used <= budget
+        failures += not ok
+        print(f"{name:<30} {response.status_code:>6} {used:>6} {budget:>6} {counter.commits:>7}  {'ok' if ok else 'OVER BUDGET' if response.status_code < 400 else 'REQUEST FAILED'}")
+        if verbose or not ok:
+            for statement in counter.statements:
+                print(f"    {statement[:160]}")
+
+    print("OK" if not failures else f"FAILED: {failures} endpoint(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main_check(verbose="-v" in sys.argv[1:]))
@@ -0,0 +1,42 @@
+# scripts/create_indexes.py (Adds indexes declared in models.py to an existing database)
+#
+# Usage (from backend/):  python -m scripts.create_indexes
+# create_all() only creates indexes together with new tables, so existing deployments need this once.
+
+from sqlalchemy import func
+from database.database import SessionLocal, engine
+from database import models
+
+def merge_duplicate_positions():
+    """Collapses duplicate (user_id, symbol) portfolio rows so the unique index can be built."""
+    db = SessionLocal()
+    try:
+        duplicates = db.query(models.Portfolio.user_id, models.Portfolio.symbol).group_by(
+            models.Portfolio.user_id, models.Portfolio.symbol
+        ).having(func.count(models.Portfolio.id) > 1).all()
+
+        for user_id, symbol in duplicates:
+            rows = db.query(models.Portfolio).filter(
+                models.Portfolio.user_id == user_id, models.Portfolio.symbol == symbol
+            ).order_by(models.Portfolio.id).all()
+            keep, extra = rows[0], rows[1:]
+            total_shares = sum(r.shares for r in rows)
+            total_cost = sum(r.shares * r.average_cost for r in rows)
+            keep.shares = total_shares
+            keep.average_cost = total_cost / total_shares if total_shares > 0 else keep.average_cost
+            for row in extra:
+                db.delete(row)
+            print(f"Merged {len(rows)} portfolio rows for user {user_id} / {symbol}")
+        db.commit()
+    finally:
+        db.close()
+
+def create_missing_indexes():
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    print("Indexes created/verified.")
+
+if __name__ == "__main__":
+    merge_duplicate_positions()
+    create_missing_indexes()
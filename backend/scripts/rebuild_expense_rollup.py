@@ -0,0 +1,18 @@
+# scripts/rebuild_expense_rollup.py (Populate / repair expense_monthly_rollup from raw expenses)
+#
+# Usage (from backend/):  python -m scripts.rebuild_expense_rollup [user_id]
+# Run once after deploying the rollup table; afterwards create_expense and bulk imports keep it current.
+
+import sys
+from database.database import SessionLocal, engine
+from database import crud, models
+
+if __name__ == "__main__":
+    models.ExpenseMonthlyRollup.__table__.create(bind=engine, checkfirst=True)
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    db = SessionLocal()
+    try:
+        crud.rebuild_expense_rollup(db, user_id)
+        print(f"Rebuilt expense_monthly_rollup for {'user ' + str(user_id) if user_id else 'all users'}.")
+    finally:
+        db.close()
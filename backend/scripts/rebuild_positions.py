@@ -0,0 +1,30 @@
+# scripts/rebuild_positions.py (Check / rebuild portfolio positions from the trades ledger)
+#
+# Usage (from backend/):
+#   python -m scripts.rebuild_positions --seed     # once, after deploying the trades table
+#   python -m scripts.rebuild_positions --check    # report positions that disagree with the ledger
+#   python -m scripts.rebuild_positions [user_id]  # replace positions with a replay of the ledger
+
+import sys
+from database.database import SessionLocal, engine
+from database import crud, models
+
+if __name__ == "__main__":
+    models.Trade.__table__.create(bind=engine, checkfirst=True)
+    args = sys.argv[1:]
+    db = SessionLocal()
+    try:
+        if "--seed" in args:
+            print(f"Seeded {crud.seed_ledger_from_positions(db)} opening trade(s) for positions with no ledger history.")
+        elif "--check" in args:
+            mismatches = crud.find_ledger_mismatches(db)
+            for m in mismatches:
+                print(f"user {m['user_id']} {m['symbol']}: position {m['position']} != ledger {m['ledger']}")
+            print(f"{len(mismatches)} position(s) disagree with the ledger.")
+            sys.exit(1 if mismatches else 0)
+        else:
+            user_id = int(args[0]) if args else None
+            crud.rebuild_positions_from_ledger(db, user_id)
+            print(f"Rebuilt positions for {'user ' + str(user_id) if user_id else 'all users'}.")
+    finally:
+        db.close()
@@ -0,0 +1,103 @@
+# scripts/stress_trades.py (Concurrency stress test for crud.update_portfolio_shares)
+#
+# Usage (from backend/):  python -m scripts.stress_trades [DATABASE_URL] [--threads N] [--trades M]
+#
+# Hammers ONE position from many threads with a random mix of buys and sells (sized so sells
+# regularly race each other for the last shares), then checks:
+# - the position equals a replay of the trades ledger (no lost updates, no unlogged fills)
+# - the ledger has exactly one row per accepted trade
+# - shares never went negative (no oversell)
+# Default target is a throwaway SQLite file; pass a scratch Postgres URL for real row-level concurrency.
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from database import crud, models
+
+SYMBOL = "AAPL"
+
+def run(database_url: str, threads: int, trades: int) -> int:
+    connect_args = {"timeout": 60, "check_same_thread": False} if database_url.startswith("sqlite") else {}
+    engine = create_engine(database_url, pool_size=threads, max_overflow=0, connect_args=connect_args)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    with Session() as db:
+        user = models.User(email=f"stress{time.time_ns()}@finity.test", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        crud.update_portfolio_shares(db, user_id, SYMBOL, 5000.0, "Buy")
+
+    counts = {"accepted": 1, "rejected": 0, "errors": 0} # The opening buy above is accepted
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        start.wait()
+        with Session() as db:
+            for _ in range(trades):
+                action = "Buy" if rng.random() < 0.5 else "Sell"
+                outcome = "accepted"
+                try:
+                    crud.update_portfolio_shares(db, user_id, SYMBOL, rng.uniform(50, 400), action)
+                except HTTPException as e:
+                    outcome = "rejected" if e.status_code == 400 else "errors"
+                    if outcome == "errors":
+                        print(f"  error: {e.detail}")
+                with lock:
+                    counts[outcome] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    began = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    failures = 0
+    with Session() as db:
+        ledger_rows = db.query(func.count(models.Trade.id)).filter(models.Trade.user_id == user_id).scalar()
+        position = crud.get_asset_in_portfolio(db, user_id, SYMBOL)
+        mismatches = crud.find_ledger_mismatches(db, user_id)
+
+    attempted = threads * trades
+    print(f"{attempted} trades from {threads} threads in {elapsed:.2f}s ({attempted / elapsed:.0f}/s): "
+          f"{counts['accepted'] - 1} accepted, {counts['rejected']} rejected sells, {counts['errors']} errors")
+    print(f"position: {position.shares:.6f} shares @ {position.average_cost:.4f}")
+
+    if ledger_rows != counts["accepted"]:
+        failures += 1
+        print(f"FAIL ledger has {ledger_rows} rows for {counts['accepted']} accepted trades")
+    if position.shares < 0:
+        failures += 1
+        print("FAIL position went negative (oversold)")
+    for m in mismatches:
+        failures += 1
+        print(f"FAIL position {m['position']} != ledger replay {m['ledger']} (lost update)")
+    if counts["errors"]:
+        failures += 1
+        print("FAIL some trades errored")
+    print("ok" if not failures else f"{failures} check(s) failed")
+    engine.dispose()
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database_url", nargs="?")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--trades", type=int, default=50, help="trades per thread")
+    args = parser.parse_args()
+
+    if args.database_url:
+        raise SystemExit(1 if run(args.database_url, args.threads, args.trades) else 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        raise SystemExit(1 if run(f"sqlite:///{os.path.join(tmp, 'stress.db')}", args.threads, args.trades) else 0)
@@ -0,0 +1,135 @@
+# utils/bulk_import.py (Streaming CSV / NDJSON import with chunked inserts)
+
+import codecs
+import csv
+import json
+from dotenv import load_dotenv
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", 1000))
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", 50000))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", 1000)) # Errors reported back (all are counted)
+
+def detect_format(request: Request, fmt: Optional[str]) -> str:
+    """'csv' or 'ndjson', from the ?format= override or the Content-Type header."""
+    if fmt:
+        fmt = fmt.lower()
+    else:
+        content_type = request.headers.get("content-type", "").lower()
+        fmt = "csv" if "csv" in content_type else "ndjson" if ("ndjson" in content_type or "jsonl" in content_type) else None
+
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)."
+        )
+    return fmt
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    """Decodes the request body as it arrives and yields complete lines."""
+    # Incremental decoder: a multi-byte character may be split across network chunks
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_records(request: Request, fmt: str) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Yields (row_number, record, error) per data row. Blank lines are skipped.
+    NOTE: CSV is parsed line by line, so quoted fields cannot contain newlines.
+    """
+    header = None
+    row_number = 0
+    async for line in _iter_lines(request):
+        if not line.strip():
+            continue
+
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [h.strip().lower() for h in values]
+                continue
+            row_number += 1
+            if len(values) != len(header):
+                yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            # Empty cells mean "not provided" so optional fields fall back to their defaults
+            yield row_number, {k: v.strip() for k, v in zip(header, values) if v.strip() != ""}, None
+        else:
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Each line must be a JSON object"
+                continue
+            yield row_number, record, None
+
+async def run_bulk_import(
+    request: Request,
+    fmt: str,
+    schema: Type[BaseModel],
+    to_row: Callable[[BaseModel], Dict],
+    insert_chunk: Callable[[List[Dict]], None],
+    finish: Callable[[], None],
+    rollback: Callable[[], None]
+) -> Dict:
+    """
+    Validates rows as they stream in and inserts them in chunks of BULK_INSERT_CHUNK_SIZE.
+    Invalid rows are reported and skipped; valid rows are written in ONE transaction:
+    `insert_chunk` must not commit, `finish` commits, `rollback` undoes everything on a DB error.
+    """
+    chunk: List[Dict] = []
+    errors: List[Dict] = []
+    inserted = failed = 0
+
+    try:
+        async for row_number, record, error in iter_records(request, fmt):
+            if inserted + failed + len(chunk) >= BULK_IMPORT_MAX_ROWS:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Imports are limited to {BULK_IMPORT_MAX_ROWS} rows."
+                )
+
+            if error is None:
+                try:
+                    chunk.append(to_row(schema.model_validate(record)))
+                except ValidationError as e:
+                    error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+            if error is not None:
+                failed += 1
+                if len(errors) < BULK_IMPORT_MAX_ERRORS:
+                    errors.append({"row": row_number, "error": error})
+                continue
+
+            if len(chunk) >= BULK_INSERT_CHUNK_SIZE:
+                await run_in_threadpool(insert_chunk, chunk)
+                inserted += len(chunk)
+                chunk = []
+
+        if chunk:
+            await run_in_threadpool(insert_chunk, chunk)
+            inserted += len(chunk)
+        await run_in_threadpool(finish)
+    except HTTPException:
+        await run_in_threadpool(rollback)
+        raise
+    except Exception as e:
+        await run_in_threadpool(rollback)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Import failed, nothing was saved: {e}")
+
+    return {"inserted": inserted, "failed": failed, "errors": errors}
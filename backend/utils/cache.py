@@ -0,0 +1,92 @@
+# utils/cache.py (Small in-process caches shared by the backend)
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after `ttl` seconds.
+    Thread-safe, because sync FastAPI routes run in a threadpool.
+    NOTE: This is per-process. With several uvicorn workers, each worker keeps its own
+    copy, so the TTL is what bounds staleness after a write on another worker.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value (and marks it recently used), or `default` if missing/expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Stores a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Drops a single entry (no-op if it is not cached)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class ExpiringSet:
+    """
+    Set whose members are dropped only once their own expiry (a wall-clock Unix timestamp, or None
+    for never) has passed: no size cap, so nothing is ever evicted early. Thread-safe.
+    NOTE: Per-process, like TTLCache.
+    """
+
+    def __init__(self):
+        self._expiry: Dict[Hashable, float] = {}
+        self._heap: List[tuple] = [] # (expires_at, key), to prune without scanning every member
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            if self._expiry.get(key) == expires_at:
+                del self._expiry[key]
+
+    def add(self, key: Hashable, expires_at: Optional[float] = None):
+        with self._lock:
+            self._prune(time.time())
+            expires_at = float("inf") if expires_at is None else float(expires_at)
+            if expires_at > self._expiry.get(key, float("-inf")):
+                self._expiry[key] = expires_at
+                if expires_at != float("inf"):
+                    heapq.heappush(self._heap, (expires_at, key))
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            expires_at = self._expiry.get(key)
+            return expires_at is not None and expires_at > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
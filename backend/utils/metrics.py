@@ -0,0 +1,54 @@
+# utils/metrics.py (Lightweight in-process latency recorders)
+
+import threading
+from collections import deque
+from typing import Dict
+
+class LatencyRecorder:
+    """Keeps the most recent `max_samples` latencies (seconds) and reports percentiles in ms."""
+
+    def __init__(self, name: str, max_samples: int = 1000):
+        self.name = name
+        self.count = 0
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def pct(p: float) -> float:
+            index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+            return round(samples[index] * 1000, 1)
+
+        return {
+            "count": count,
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 1),
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+        }
+
+_RECORDERS: Dict[str, LatencyRecorder] = {}
+_registry_lock = threading.Lock()
+
+def get_latency_recorder(name: str) -> LatencyRecorder:
+    """Returns the named recorder, creating it on first use."""
+    with _registry_lock:
+        if name not in _RECORDERS:
+            _RECORDERS[name] = LatencyRecorder(name)
+        return _RECORDERS[name]
+
+def latency_snapshot() -> Dict[str, Dict]:
+    """Percentile summary of every registered recorder (for the debug route)."""
+    with _registry_lock:
+        recorders = list(_RECORDERS.values())
+    return {r.name: r.snapshot() for r in recorders}
@@ -0,0 +1,23 @@
+# utils/pagination.py (Opaque keyset cursors)
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+
+def encode_cursor(last_date: datetime, last_id: int) -> str:
+    """Encodes the (date, id) of the last row on a page as an opaque, URL-safe token."""
+    raw = json.dumps([last_date.isoformat(), last_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Inverse of encode_cursor. Raises 400 for tokens we did not issue."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_date, last_id = json.loads(raw)
+        return datetime.fromisoformat(last_date), int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
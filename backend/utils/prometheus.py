@@ -0,0 +1,126 @@
+# utils/prometheus.py (Prometheus metrics: per-route HTTP latency, in-flight requests, LLM calls)
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from starlette.routing import Match
+
+# --- HTTP ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "finity_http_request_duration_seconds",
+    "HTTP request latency, from the first byte in to the last byte out",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "finity_http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+# --- LLM (coach_agent) ---
+
+LLM_CALL_SECONDS = Histogram(
+    "finity_llm_call_duration_seconds",
+    "Gemini call latency per coach_agent function (time holding a concurrency slot)",
+    ["function", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_CALL_ERRORS = Counter(
+    "finity_llm_call_errors_total",
+    "Gemini calls that raised, per coach_agent function and exception type",
+    ["function", "error"],
+)
+LLM_TOKENS = Histogram(
+    "finity_llm_tokens",
+    "Tokens per Gemini call, from the response usage metadata",
+    ["function", "kind"],
+    buckets=(16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+
+def observe_llm_usage(function: str, response):
+    """Records input/output token counts from a response's usage_metadata (if the response has one)."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    if usage.prompt_token_count is not None:
+        LLM_TOKENS.labels(function, "input").observe(usage.prompt_token_count)
+    # Thinking tokens are billed as output, so they count toward it
+    output = (usage.candidates_token_count or 0) + (usage.thoughts_token_count or 0)
+    if output:
+        LLM_TOKENS.labels(function, "output").observe(output)
+
+@contextmanager
+def track_llm_call(function: str):
+    """
+    Times the Gemini call in the block for `function` and counts it as an error if it raises.
+    A caller that goes away mid-call (client disconnect closing a stream, task cancellation) is
+    recorded with outcome "cancelled" and is not an error.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except (GeneratorExit, asyncio.CancelledError):
+        LLM_CALL_SECONDS.labels(function, "cancelled").observe(time.perf_counter() - started)
+        raise
+    except BaseException as e:
+        LLM_CALL_SECONDS.labels(function, "error").observe(time.perf_counter() - started)
+        LLM_CALL_ERRORS.labels(function, type(e).__name__).inc()
+        raise
+    LLM_CALL_SECONDS.labels(function, "ok").observe(time.perf_counter() - started)
+
+# --- Exposition ---
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """(body, content type) for /metrics. With PROMETHEUS_MULTIPROC_DIR set, aggregates every worker."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def _route_label(scope: Dict) -> str:
+    """The matched route's path template (bounded label set), not the raw path."""
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path # Path matched, method didn't (a 405)
+    return partial or "unmatched"
+
+class PrometheusMiddleware:
+    """ASGI middleware feeding HTTP_REQUEST_SECONDS and HTTP_IN_FLIGHT for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], _route_label(scope)
+        status_code = 500 # If the app raises before responding
+        started = time.perf_counter()
+
+        async def send_with_status(message: Dict):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
@@ -0,0 +1,120 @@
+# utils/sql_timing.py (Per-request SQL statement counting, Server-Timing headers and N+1 detection)
+
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+SQL_TIMING_ENABLED = os.getenv("SQL_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+# A request is logged when it crosses either threshold
+SQL_SLOW_REQUEST_MS = float(os.getenv("SQL_SLOW_REQUEST_MS", 200)) # Cumulative DB time
+SQL_MAX_STATEMENTS = int(os.getenv("SQL_MAX_STATEMENTS", 20))
+# The same statement text this many times in one request is flagged as an N+1 suspect
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", 5))
+
+class RequestSQLStats:
+    """Statements and DB time accumulated by one request (across threads and both engines)."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements: Counter = Counter()
+        self._lock = threading.Lock() # A request can run statements from several threadpool hops at once
+
+    def record(self, statement: str, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.db_seconds += seconds
+            self.statements[statement] += 1
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> List[tuple]:
+        """(statement, times) for every statement run at least `threshold` times, most repeated first."""
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+# Set by the middleware for the duration of a request. Threadpool calls (run_in_threadpool, sync
+# routes and dependencies) run in a copy of the request's context, so they see the same stats object.
+_current: ContextVar[Optional[RequestSQLStats]] = ContextVar("request_sql_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_timing_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("sql_timing_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    started = exception_context.connection.info.get("sql_timing_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+def instrument_engine(sync_engine):
+    """Hooks an engine (for an AsyncEngine, pass .sync_engine) into the per-request stats."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+def server_timing(stats: RequestSQLStats, elapsed: float) -> str:
+    metrics = [
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.count} SQL statements"',
+        f"app;dur={elapsed * 1000:.1f}",
+    ]
+    repeats = stats.repeated()
+    if repeats:
+        metrics.append(f'db-repeat;desc="N+1 suspect: {repeats[0][1]}x same statement"')
+    return ", ".join(metrics)
+
+def _shorten(statement: str, limit: int = 160) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+def report(method: str, path: str, stats: RequestSQLStats, elapsed: float):
+    """Logs the request if it crossed a threshold or repeated a statement."""
+    db_ms = stats.db_seconds * 1000
+    repeats = stats.repeated()
+    if db_ms < SQL_SLOW_REQUEST_MS and stats.count <= SQL_MAX_STATEMENTS and not repeats:
+        return
+    print(f"[SQL] {method} {path}: {stats.count} statements, {db_ms:.1f}ms in DB, {elapsed * 1000:.1f}ms total")
+    for statement, times in repeats:
+        print(f"[SQL]   N+1 suspect ({times}x): {_shorten(statement)}")
+
+class SQLTimingMiddleware:
+    """
+    ASGI middleware: counts the SQL each HTTP request runs (via the engine hooks above) and adds a
+    Server-Timing header (statement count, DB time, N+1 flag). Pure ASGI rather than
+    BaseHTTPMiddleware, so streaming responses pass straight through; their header reflects
+    the SQL run before the first byte, while the log line covers the whole stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSQLStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Dict):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, time.perf_counter() - started).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            report(scope["method"], scope["path"], stats, time.perf_counter() - started)
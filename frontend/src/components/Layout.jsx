@@ -15,6 +15,7 @@ import {
 } from "lucide-react";
 import { useState } from "react";
 import { useTheme } from "../context/ThemeContext";
+import { authAPI } from "../utils/api";
 
 function Layout({ children }) {
   const location = useLocation();
@@ -33,6 +34,8 @@ function Layout({ children }) {
   ];
 
   const handleLogout = () => {
+    // Best effort: the token is dropped locally either way
+    authAPI.logout().catch(() => {});
     localStorage.removeItem("token");
     localStorage.removeItem("questionnaireCompleted");
     navigate("/login");
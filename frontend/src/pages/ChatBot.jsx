@@ -19,6 +19,7 @@ function ChatBot() {
   ]);
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
   const { showAchievement } = useAchievement();
 
@@ -53,7 +54,8 @@ function ChatBot() {
 
     try {
       // Call backend chat API
-      const response = await chatAPI.sendMessage(currentInput);
+      const response = await chatAPI.sendMessage(currentInput, sessionId);
+      if (response.session_id) setSessionId(response.session_id);
 
       const aiResponse = {
         role: "assistant",
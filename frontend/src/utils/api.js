@@ -78,6 +78,13 @@ export const authAPI = {
       body: JSON.stringify({ email, password }),
     });
   },
+
+  // Revoke the current token server-side
+  logout: async () => {
+    return apiRequest("/logout", {
+      method: "POST",
+    });
+  },
 };
 
 // User Profile API calls
@@ -172,11 +179,11 @@ export const marketAPI = {
 
 // Chat API calls
 export const chatAPI = {
-  // Send a message to the AI chatbot
-  sendMessage: async (message) => {
+  // Send a message to the AI chatbot (pass the session_id from the previous reply to continue it)
+  sendMessage: async (message, sessionId = null) => {
     return apiRequest("/chat", {
       method: "POST",
-      body: JSON.stringify({ message }),
+      body: JSON.stringify({ message, session_id: sessionId }),
     });
   },
 };